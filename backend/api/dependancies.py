@@ -2,24 +2,24 @@ from fastapi import Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from backend.database.db import get_db
-from backend.models.user import User
+from backend.schemas.user import UserPrincipal
 from backend.auth.auth import get_current_user
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_active_user(current_user: UserPrincipal = Depends(get_current_user)) -> UserPrincipal:
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
-def get_db_user(
+async def get_db_user(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-) -> tuple[Session, User]:
+    current_user: UserPrincipal = Depends(get_current_active_user)
+) -> tuple[Session, UserPrincipal]:
     return db, current_user
 
-def get_db_user_admin(
+async def get_db_user_admin(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
-) -> tuple[Session, User]:
+    current_user: UserPrincipal = Depends(get_current_active_user)
+) -> tuple[Session, UserPrincipal]:
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Insufficient permissions")
     return db, current_user
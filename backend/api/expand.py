@@ -0,0 +1,95 @@
+from typing import Any, Callable, Optional
+from fastapi import HTTPException, Query, status
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+from backend.crud.loaders import Loaders
+
+class Relation:
+    """
+    A relation a route can embed with ?expand=: how to serialize it and the
+    loaders that fetch it alongside its parent
+    """
+    def __init__(self, schema, loaders: Loaders):
+        self.adapter = TypeAdapter(schema)
+        self.loaders = loaders
+
+class Expand:
+    """
+    Dependency parsing ?expand= and ?fields= for a resource. Responses carry
+    the slim schema by default; expand embeds the named relations and fields
+    limits the top-level fields returned. Relations that aren't expanded are
+    never read from the ORM object, so they can't trigger lazy loads.
+    """
+    def __init__(self, schema: type[BaseModel], loaders: Loaders = Loaders(), **relations: Relation):
+        self.schema = schema
+        self.loaders = loaders
+        self.relations = relations
+        # ?fields= uses the names clients see, which may be aliases
+        self.field_names = {
+            (field.serialization_alias or field.alias or name): name
+            for name, field in schema.model_fields.items()
+        }
+
+    def __call__(
+        self,
+        expand: Optional[str] = Query(None, description="Comma separated relations to embed"),
+        fields: Optional[str] = Query(None, description="Comma separated fields to return")
+    ) -> "Expansion":
+        expanded = self._parse(expand, self.relations, "expand")
+        selected = self._parse(fields, self.field_names, "fields")
+        return Expansion(self, expanded, {self.field_names[name] for name in selected} or None)
+
+    @staticmethod
+    def _parse(value: Optional[str], allowed, param: str) -> list[str]:
+        names = [name.strip() for name in value.split(",") if name.strip()] if value else []
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown {param} value(s): {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+            )
+        return names
+
+class Expansion:
+    def __init__(self, expand: Expand, relations: list[str], fields: Optional[set[str]]):
+        self._expand = expand
+        self.relations = relations
+        self.fields = fields
+
+    @property
+    def options(self) -> Loaders:
+        """
+        The route's loaders plus those of the expanded relations, for CRUD reads
+        """
+        loaders = self._expand.loaders
+        for name in self.relations:
+            loaders = loaders + self._expand.relations[name].loaders
+        return loaders
+
+    def dump(self, obj) -> dict[str, Any]:
+        data = self._expand.schema.model_validate(obj).model_dump(mode="json", by_alias=True, include=self.fields)
+        for name in self.relations:
+            adapter = self._expand.relations[name].adapter
+            value = adapter.validate_python(getattr(obj, name), from_attributes=True)
+            data[name] = adapter.dump_python(value, mode="json", by_alias=True)
+        return data
+
+    def response(
+        self,
+        result,
+        status_code: int = status.HTTP_200_OK,
+        headers: Optional[dict] = None,
+        wrap: Optional[Callable[[list], Any]] = None
+    ) -> JSONResponse:
+        """
+        Serialize one object or a list of them, which wrap may embed in an
+        envelope. The route's response_model still documents the expanded shape.
+        """
+        if isinstance(result, (list, tuple)):
+            content = [self.dump(obj) for obj in result]
+            if wrap is not None:
+                content = wrap(content)
+        else:
+            content = self.dump(result)
+        return JSONResponse(content=content, status_code=status_code, headers=headers)
@@ -0,0 +1,71 @@
+from typing import Optional
+from fastapi import HTTPException, Query, Response, status
+
+from backend.config import settings
+from backend.crud.pagination import InvalidCursor
+from backend.crud.stats import row_estimates
+
+class Pagination:
+    """
+    Dependency for list routes' paging parameters. Pages are cut with a
+    keyset cursor: each full page returns an X-Next-Cursor header to pass back
+    as ?cursor= for the next one. skip is still honoured for older clients.
+
+    With ?envelope=true the items come wrapped with the total row count,
+    counted in the page's own query. Unfiltered lists over tables larger than
+    PAGE_TOTAL_ESTIMATE_ROWS report the planner's cached estimate instead.
+    """
+    def __init__(
+        self,
+        skip: int = Query(0, ge=0),
+        limit: int = Query(100, ge=1, le=1000),
+        cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+        envelope: bool = Query(False, description="Wrap items with the total count and next cursor")
+    ):
+        self.skip = skip
+        self.limit = limit
+        self.cursor = cursor
+        self.envelope = envelope
+        self.next_cursor: Optional[str] = None
+        self.total: Optional[int] = None
+        self.total_exact = True
+
+    async def fetch(self, crud, db, *args, order_by: str = None, options=None, **filters) -> list:
+        with_total = self.envelope
+        if with_total and not args and not filters:
+            estimate = await row_estimates.get(db, crud._model)
+            if estimate is not None and estimate >= settings.PAGE_TOTAL_ESTIMATE_ROWS:
+                self.total, self.total_exact = estimate, False
+                with_total = False
+
+        try:
+            page = await crud.aget_page(
+                db, self.limit, *args, cursor=self.cursor, skip=self.skip, order_by=order_by,
+                options=options, with_total=with_total, **filters
+            )
+        except InvalidCursor as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+        self.next_cursor = page.next_cursor
+        if with_total:
+            self.total = page.total
+        return page.items
+
+    def wrap(self, items):
+        """
+        The response body for a page of items: the items themselves, or the envelope
+        """
+        if not self.envelope:
+            return items
+        return {
+            "items": items,
+            "total": self.total,
+            "total_exact": self.total_exact,
+            "next_cursor": self.next_cursor
+        }
+
+    @property
+    def headers(self) -> dict[str, str]:
+        return {"X-Next-Cursor": self.next_cursor} if self.next_cursor else {}
+
+    def apply(self, response: Response):
+        response.headers.update(self.headers)
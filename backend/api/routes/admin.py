@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import distinct, select, func, tuple_
 from sqlalchemy.orm import Session
-from typing import Dict, Any
-from datetime import datetime, timedelta
+from typing import Dict, Any, Literal, Optional
+from datetime import date, datetime, timedelta
 
+from backend.cache import cache_stats
+from backend.database.db import execute
+from backend.database.pool import pool_stats
 from backend.api.dependancies import get_db_user_admin
 from backend.models.user import User
 from backend.crud.daily_log import daily_log_crud
 from backend.crud.food_entry import food_entry_crud
-from backend.crud.food import food_crud
+from backend.crud.pagination import InvalidCursor, decode_cursor, encode_cursor
+from backend.crud.stats import system_stats
 
 router = APIRouter(
     prefix="/admin",
@@ -16,68 +21,112 @@ router = APIRouter(
 
 
 @router.get("/stats")
-async def get_system_stats(db_user: tuple[Session, User] = Depends(get_db_user_admin)):
+async def get_system_stats(
+    approximate: bool = Query(False, description="Estimate the large tables from planner statistics"),
+    db_user: tuple[Session, User] = Depends(get_db_user_admin)
+):
     db, current_user = db_user
 
-    total_users = db.query(User).count()
-    active_users = db.query(User).filter(User.is_active == True).count()
-    admins = db.query(User).filter(User.role == "admin").count()
-
-    total_foods = db.query(food_crud._model).count()
-    total_logs = db.query(daily_log_crud._model).count()
-    total_entries = db.query(food_entry_crud._model).count()
-
+    stats = await system_stats.get(db, approximate)
     return {
-        "system_stats": {
-            "total_users": total_users,
-            "active_users": active_users,
-            "admin_users": admins,
-            "total_foods": total_foods,
-            "total_daily_logs": total_logs,
-            "total_food_entries": total_entries,
-            "timestamp": datetime.now().isoformat()
-        }
+        "system_stats": {**stats["counts"], "timestamp": stats["timestamp"]},
+        "exact": stats["exact"],
+        "age_seconds": stats["age_seconds"]
     }
 
 
+def _decode_cursor(cursor: str, size: int) -> tuple:
+    try:
+        values = decode_cursor(cursor, size)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+    if not all(isinstance(value, int) for value in values):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return tuple(values)
+
+
 @router.get("/users-activity")
 async def get_users_activity(
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=1000),
     days: int = 7,
+    order: Literal["activity", "user_id"] = "activity",
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
     db_user: tuple[Session, User] = Depends(get_db_user_admin)
 ):
     db, current_user = db_user
 
-    cutoff_date = datetime.now() - timedelta(days=days)
-    active_users = []
-    users = db.query(User).filter(User.is_active == True).limit(limit).all()
-
-    for user in users:
-        log_count = db.query(daily_log_crud._model).filter(
-            daily_log_crud._model.user_id == user.id,
-            daily_log_crud._model.date >= cutoff_date
-        ).count()
-
-        entry_count = db.query(food_entry_crud._model).join(
-            daily_log_crud._model,
-            food_entry_crud._model.daily_log_id == daily_log_crud._model.id
-        ).filter(
-            daily_log_crud._model.user_id == user.id,
-            daily_log_crud._model.date >= cutoff_date
-        ).count()
-
-        if log_count > 0 or entry_count > 0:
-            active_users.append({
-                "user_id": user.id,
-                "username": user.username,
-                "email": user.email,
-                "logs_count": log_count,
-                "entries_count": entry_count
-            })
+    DailyLog, FoodEntry = daily_log_crud._model, food_entry_crud._model
+    cutoff_date = date.today() - timedelta(days=days)
+
+    # Per-user counts over the period in one pass; users without logs in it
+    # drop out of the join, so only active users come back
+    activity = (
+        select(
+            DailyLog.user_id,
+            func.count(distinct(DailyLog.id)).label("logs_count"),
+            func.count(FoodEntry.id).label("entries_count")
+        )
+        .outerjoin(FoodEntry, FoodEntry.daily_log_id == DailyLog.id)
+        .filter(DailyLog.date > cutoff_date)
+        .group_by(DailyLog.user_id)
+        .subquery()
+    )
+    stmt = (
+        select(User.id, User.username, User.email, activity.c.logs_count, activity.c.entries_count)
+        .join(activity, activity.c.user_id == User.id)
+        .filter(User.is_active == True)
+    )
+
+    # Keyset pagination: the cursor holds the sort key of the last row served
+    if order == "activity":
+        key = (activity.c.entries_count, activity.c.logs_count, User.id)
+        stmt = stmt.order_by(*(column.desc() for column in key))
+        if cursor:
+            stmt = stmt.filter(tuple_(*key) < tuple_(*_decode_cursor(cursor, len(key))))
+    else:
+        stmt = stmt.order_by(User.id)
+        if cursor:
+            stmt = stmt.filter(User.id > _decode_cursor(cursor, 1)[0])
+
+    rows = (await execute(db, stmt.limit(limit + 1))).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        key_values = (last.entries_count, last.logs_count, last.id) if order == "activity" else (last.id,)
+        next_cursor = encode_cursor(key_values)
+
+    active_users = [
+        {
+            "user_id": row.id,
+            "username": row.username,
+            "email": row.email,
+            "logs_count": row.logs_count,
+            "entries_count": row.entries_count
+        }
+        for row in rows
+    ]
 
     return {
         "time_period": f"Last {days} days",
         "total_active_users": len(active_users),
         "users": active_users,
+        "next_cursor": next_cursor,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+@router.get("/cache-stats")
+async def get_cache_stats(db_user: tuple[Session, User] = Depends(get_db_user_admin)):
+    return {
+        "caches": cache_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+@router.get("/db-pool")
+async def get_db_pool_stats(db_user: tuple[Session, User] = Depends(get_db_user_admin)):
+    return {
+        "pools": pool_stats(),
         "timestamp": datetime.now().isoformat()
     }
@@ -4,13 +4,14 @@ from sqlalchemy.orm import Session
 from datetime import timedelta
 
 from backend.database.db import get_db
-from backend.auth import authenticate_user, create_access_token, get_current_user
+from backend.auth import aauthenticate_user, create_user_token, get_current_user, revoke_access_token
+from backend.auth.auth import oauth2_scheme
 from backend.schemas.token import Token
 from backend.schemas.user import UserCreate, UserResponse
 from backend.crud.user import user_crud
-from backend.auth.security import get_password_hash
+from backend.auth.security import aget_password_hash
 from backend.config import settings
-from backend.models.user import User
+from backend.schemas.user import UserPrincipal
 from backend.api.dependancies import get_current_active_user
 
 router = APIRouter(
@@ -21,18 +22,16 @@ router = APIRouter(
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def register_user(user_create: UserCreate, db: Session = Depends(get_db)):
-    if user_crud.get_by_username(db, user_create.username):
-        raise HTTPException(status_code=400, detail="Username already registered")
-
-    if user_crud.get_by_email(db, user_create.email):
-        raise HTTPException(status_code=400, detail="Email already registered")
-
-    hashed_password = get_password_hash(user_create.hashed_password)
+    hashed_password = await aget_password_hash(user_create.hashed_password)
     user_data = user_create.model_dump(exclude={"password"})
     user_data["hashed_password"] = hashed_password
     user_data["is_active"] = True
 
-    db_user = user_crud.create(db, user_data)
+    # Duplicate usernames and emails are caught by the unique constraints
+    try:
+        db_user = await user_crud.acreate(db, user_data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return db_user
 
 
@@ -42,24 +41,30 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session =
 
 
 @router.post("/logout")
-async def logout(response: Response):
+async def logout(
+    response: Response,
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db)
+):
+    await revoke_access_token(db, token)
     response.delete_cookie(key="access_token")
     return {"detail": "Successfully logged out"}
 
 
 @router.post("/refresh", response_model=Token)
-async def refresh_token(current_user: User = Depends(get_current_active_user)):
+async def refresh_token(current_user: UserPrincipal = Depends(get_current_active_user)):
     expires_delta = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": current_user.username},
-        expires_delta=expires_delta
-    )
+    access_token = create_user_token(current_user, expires_delta=expires_delta)
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_details(current_user: User = Depends(get_current_active_user)):
-    return current_user
+async def get_current_user_details(
+    db: Session = Depends(get_db),
+    current_user: UserPrincipal = Depends(get_current_active_user)
+):
+    # current_user is a cached principal, so load the full row for the response
+    return await user_crud.aget_one(db, id=current_user.id)
 
 
 @router.post("/token", response_model=Token)
@@ -67,12 +72,12 @@ async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await aauthenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"}
         )
-    access_token = create_access_token(data={"sub": user.username})
+    access_token = create_user_token(user)
     return {"access_token": access_token, "token_type": "bearer"}
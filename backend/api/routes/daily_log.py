@@ -1,56 +1,182 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from typing import List
-from datetime import date
+from typing import List, Literal, Optional, Union
+from datetime import date, timedelta
 
 from backend.database.db import get_db
 from backend.api.dependancies import get_db_user
+from backend.api.expand import Expand, Expansion, Relation
+from backend.api.pagination import Pagination
 from backend.models.user import User
-from backend.schemas.daily_log import DailyLogCreate, DailyLogResponse
+from backend.schemas.daily_log import DailyLogCreate, DailyLogResponse, DailyLogExpandedResponse, DailyLogEntriesResponse, NutritionTotals, LogSummaryResponse, LogTrendsResponse
+from backend.schemas.food_entry import FoodEntryResponse
+from backend.schemas.user import UserResponse
+from backend.schemas.pagination import Page
 from backend.crud.daily_log import daily_log_crud
+from backend.crud.loaders import Loaders
+from backend.analytics import get_trends
 
 router = APIRouter(
     prefix="/logs",
     tags=["logs"]
 )
 
+log_expand = Expand(
+    DailyLogResponse,
+    user=Relation(UserResponse, Loaders(joined=["user"])),
+    food_entries=Relation(List[FoodEntryResponse], Loaders(selectin=["food_entries"], joined=["food_entries.food"])),
+    # Stored on the log itself, so embedding them costs no query
+    totals=Relation(NutritionTotals, Loaders())
+)
+
+# Date lookups return whole logs, joined in the same query as the log
+BY_DATE_LOADERS = Loaders(joined=["food_entries", "food_entries.food"])
+MAX_DATES = 366
+MAX_TREND_DAYS = 3660
+
+def _parse_dates(dates: str) -> list[date]:
+    values = [value.strip() for value in dates.split(",") if value.strip()]
+    if not values or len(values) > MAX_DATES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"dates takes 1 to {MAX_DATES} comma separated dates"
+        )
+    try:
+        return sorted({date.fromisoformat(value) for value in values})
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid date: {e}") from e
+
 @router.post("/", response_model=DailyLogResponse, status_code=status.HTTP_201_CREATED)
 async def create_daily_log(log: DailyLogCreate, db_user: tuple[Session, User] = Depends(get_db_user)):
     db, current_user = db_user
 
     # Use the date from request or default to today
     log_date = log.date if log.date else date.today()
-    
-    existing_log = daily_log_crud.get_one(
-        db,
-        daily_log_crud._model.user_id == current_user.id,
-        daily_log_crud._model.date == log_date  # Use log_date instead of log.date
-    )
-    if existing_log:
+
+    # The insert itself finds an existing log, so there's no separate check to race
+    daily_log, created = await daily_log_crud.aget_or_create(db, current_user.id, log_date)
+    if not created:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Log already exists for date {log_date}"
         )
+    return daily_log
+
+@router.put("/by-date/{log_date}", response_model=DailyLogResponse)
+async def put_daily_log_by_date(
+    log_date: date,
+    response: Response,
+    db_user: tuple[Session, User] = Depends(get_db_user)
+):
+    """
+    Idempotent get-or-create of the current user's log for a date:
+    201 when it was created, 200 when it already existed
+    """
+    db, current_user = db_user
+    daily_log, created = await daily_log_crud.aget_or_create(db, current_user.id, log_date)
+    if created:
+        response.status_code = status.HTTP_201_CREATED
+    return daily_log
+
+@router.get("/by-date/", response_model=List[DailyLogEntriesResponse])
+async def get_logs_by_dates(
+    dates: str = Query(..., description="Comma separated dates, e.g. 2024-01-01,2024-01-02"),
+    db_user: tuple[Session, User] = Depends(get_db_user)
+):
+    """
+    The current user's logs on the given dates, oldest first. Dates without a log are left out.
+    """
+    db, current_user = db_user
+    return await daily_log_crud.aget_by_dates(db, current_user.id, _parse_dates(dates), options=BY_DATE_LOADERS)
+
+@router.get("/by-date/{log_date}", response_model=DailyLogEntriesResponse)
+async def get_log_by_date(log_date: date, db_user: tuple[Session, User] = Depends(get_db_user)):
+    db, current_user = db_user
+    logs = await daily_log_crud.aget_by_dates(db, current_user.id, [log_date], options=BY_DATE_LOADERS)
+    if not logs:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"No log for date {log_date}")
+    return logs[0]
 
-    log_data = log.model_dump(exclude={'user_id'})  # Exclude user_id from request
-    log_data["user_id"] = current_user.id  # Always use current user's ID
-    log_data["date"] = log_date  # Explicitly set the date
-    return daily_log_crud.create(db, log_data)
+@router.get("/summary", response_model=LogSummaryResponse)
+async def get_log_summary(
+    start: Optional[date] = Query(None, alias="from", description="First day, 29 days before to by default"),
+    end: Optional[date] = Query(None, alias="to", description="Last day, today by default"),
+    bucket: Literal["day", "week", "month"] = Query("day"),
+    db_user: tuple[Session, User] = Depends(get_db_user)
+):
+    """
+    The current user's nutrient totals and daily averages per day, week or month
+    """
+    db, current_user = db_user
+    end = end or date.today()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="from must not be after to")
 
-@router.get("/", response_model=List[DailyLogResponse])
-async def get_user_logs(skip: int = 0, limit: int = 100, db_user: tuple[Session, User] = Depends(get_db_user)):
+    buckets = await daily_log_crud.aget_summary(db, current_user.id, start, end, bucket)
+    return {"start": start, "end": end, "bucket": bucket, "buckets": buckets}
+
+@router.get("/trends", response_model=LogTrendsResponse)
+async def get_log_trends(
+    start: Optional[date] = Query(None, alias="from", description="First day, 89 days before to by default"),
+    end: Optional[date] = Query(None, alias="to", description="Last day, today by default"),
+    db_user: tuple[Session, User] = Depends(get_db_user)
+):
+    """
+    The current user's daily totals with 7 and 30 day moving averages,
+    day-over-day deltas and macro percentages, one value per day
+    """
     db, current_user = db_user
-    logs = daily_log_crud.get_many(db, limit=limit, skip=skip, user_id=current_user.id)
-    return logs
+    end = end or date.today()
+    start = start or end - timedelta(days=89)
+    if start > end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="from must not be after to")
+    if (end - start).days >= MAX_TREND_DAYS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Ranges span at most {MAX_TREND_DAYS} days")
 
+    return await get_trends(db, current_user.id, start, end)
 
-@router.get("/{log_id}", response_model=DailyLogResponse)
-async def get_log_by_id(log_id: int, db_user: tuple[Session, User] = Depends(get_db_user)):
+@router.get("/", response_model=Union[List[DailyLogExpandedResponse], Page[DailyLogExpandedResponse]])
+async def get_user_logs(
+    pagination: Pagination = Depends(),
+    db_user: tuple[Session, User] = Depends(get_db_user),
+    expansion: Expansion = Depends(log_expand)
+):
     db, current_user = db_user
-    log = daily_log_crud.get_one(db, daily_log_crud._model.id == log_id, user_id=current_user.id)
+    # Oldest first, walking the (user_id, date) index
+    logs = await pagination.fetch(
+        daily_log_crud, db, order_by="date", options=expansion.options, user_id=current_user.id
+    )
+    return expansion.response(logs, headers=pagination.headers, wrap=pagination.wrap)
+
+
+@router.get("/{log_id}", response_model=DailyLogExpandedResponse)
+async def get_log_by_id(
+    log_id: int,
+    db_user: tuple[Session, User] = Depends(get_db_user),
+    expansion: Expansion = Depends(log_expand)
+):
+    db, current_user = db_user
+    log = await daily_log_crud.aget_one(
+        db, daily_log_crud._model.id == log_id, options=expansion.options, user_id=current_user.id
+    )
     if not log:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Log not found")
-    return log
+    return expansion.response(log)
+
+
+@router.get("/{log_id}/totals", response_model=NutritionTotals)
+async def get_log_totals(log_id: int, db_user: tuple[Session, User] = Depends(get_db_user)):
+    """
+    Calories and macros of a log, summed over its entries as they change
+    """
+    db, current_user = db_user
+    totals = await daily_log_crud.aget_totals(
+        db, daily_log_crud._model.id == log_id, daily_log_crud._model.user_id == current_user.id
+    )
+    if log_id not in totals:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Log not found")
+    return totals[log_id]
 
 
 @router.put("/{log_id}", response_model=DailyLogResponse)
@@ -60,19 +186,19 @@ async def update_log(
     db_user: tuple[Session, User] = Depends(get_db_user)
 ):
     db, current_user = db_user
-    existing_log = daily_log_crud.get_one(db, daily_log_crud._model.id == log_id, user_id=current_user.id)
+    existing_log = await daily_log_crud.aget_one(db, daily_log_crud._model.id == log_id, user_id=current_user.id)
     if not existing_log:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Log not found")
 
-    return daily_log_crud.update(db, existing_log, log_update)
+    return await daily_log_crud.aupdate(db, existing_log, log_update)
 
 
 @router.delete("/{log_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_log(log_id: int, db_user: tuple[Session, User] = Depends(get_db_user)):
     db, current_user = db_user
-    existing_log = daily_log_crud.get_one(db, daily_log_crud._model.id == log_id, user_id=current_user.id)
+    existing_log = await daily_log_crud.aget_one(db, daily_log_crud._model.id == log_id, user_id=current_user.id)
     if not existing_log:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Log not found")
 
-    daily_log_crud.delete(db, existing_log)
+    await daily_log_crud.adelete(db, existing_log)
     return None
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Body, Depends, HTTPException, Response, status, Query
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Union
 
+from backend.config import settings
 from backend.database.db import get_db
 from backend.api.dependancies import get_db_user_admin
+from backend.api.pagination import Pagination
 from backend.models.user import User
-from backend.schemas.food import FoodCreate, FoodResponse, FoodUpdate
+from backend.schemas.food import FoodBulkUpdate, FoodCreate, FoodResponse, FoodUpdate
+from backend.schemas.bulk import BulkResponse
+from backend.schemas.pagination import Page
 from backend.crud.food import food_crud
 
 router = APIRouter(
@@ -14,15 +18,45 @@ router = APIRouter(
 )
 
 
-@router.get("/", response_model=List[FoodResponse])
-async def get_foods(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    foods = food_crud.get_many(db, limit=limit, skip=skip)
-    return foods
+@router.get("/", response_model=Union[List[FoodResponse], Page[FoodResponse]])
+async def get_foods(response: Response, pagination: Pagination = Depends(), db: Session = Depends(get_db)):
+    foods = await pagination.fetch(food_crud, db)
+    pagination.apply(response)
+    return pagination.wrap(foods)
+
+
+@router.post("/bulk", response_model=BulkResponse[FoodResponse], status_code=status.HTTP_201_CREATED)
+async def create_foods_bulk(
+    foods: List[FoodCreate] = Body(..., max_length=settings.BULK_MAX_ROWS),
+    db_user: tuple[Session, User] = Depends(get_db_user_admin)
+):
+    """
+    Create many foods in one transaction. Rows a constraint rejects are
+    reported in errors by their index and the rest are created.
+    """
+    db, admin_user = db_user
+    return await food_crud.abulk_create(db, foods)
+
+
+@router.put("/bulk", response_model=BulkResponse[FoodResponse])
+async def update_foods_bulk(
+    foods: List[FoodBulkUpdate] = Body(..., max_length=settings.BULK_MAX_ROWS),
+    db_user: tuple[Session, User] = Depends(get_db_user_admin)
+):
+    """
+    Update many foods by id in one transaction, changing only the fields sent.
+    Each id may appear once.
+    """
+    db, admin_user = db_user
+    try:
+        return await food_crud.abulk_update(db, foods)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
 @router.get("/{food_id}", response_model=FoodResponse)
 async def get_food_by_id(food_id: int, db: Session = Depends(get_db)):
-    food = food_crud.get_one(db, food_crud._model.id == food_id)
+    food = await food_crud.get_cached(db, food_id)
     if not food:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food not found")
     return food
@@ -31,7 +65,7 @@ async def get_food_by_id(food_id: int, db: Session = Depends(get_db)):
 @router.post("/", response_model=FoodResponse, status_code=status.HTTP_201_CREATED)
 async def create_food(food: FoodCreate, db_user: tuple[Session, User] = Depends(get_db_user_admin)):
     db, admin_user = db_user
-    return food_crud.create(db, food)
+    return await food_crud.acreate(db, food)
 
 
 @router.put("/{food_id}", response_model=FoodResponse)
@@ -41,24 +75,32 @@ async def update_food(
     db_user: tuple[Session, User] = Depends(get_db_user_admin)
 ):
     db, admin_user = db_user
-    existing_food = food_crud.get_one(db, food_crud._model.id == food_id)
+    existing_food = await food_crud.aget_one(db, food_crud._model.id == food_id)
     if not existing_food:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food not found")
-    return food_crud.update(db, existing_food, food_update)
+    return await food_crud.aupdate(db, existing_food, food_update)
 
 
 @router.delete("/{food_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_food(food_id: int, db_user: tuple[Session, User] = Depends(get_db_user_admin)):
     db, admin_user = db_user
-    existing_food = food_crud.get_one(db, food_crud._model.id == food_id)
+    existing_food = await food_crud.aget_one(db, food_crud._model.id == food_id)
     if not existing_food:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food not found")
-    food_crud.delete(db, existing_food)
+    await food_crud.adelete(db, existing_food)
     return None
 
 
 @router.get("/search/", response_model=List[FoodResponse])
-async def search_foods(query: str = Query(..., min_length=1), limit: int = 20, db: Session = Depends(get_db)):
+async def search_foods(
+    response: Response,
+    query: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=1000),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    db: Session = Depends(get_db)
+):
     search_pattern = f"%{query}%"
-    foods = db.query(food_crud._model).filter(food_crud._model.name.ilike(search_pattern)).limit(limit).all()
+    pagination = Pagination(skip=0, limit=limit, cursor=cursor, envelope=False)
+    foods = await pagination.fetch(food_crud, db, food_crud._model.name.ilike(search_pattern))
+    pagination.apply(response)
     return foods
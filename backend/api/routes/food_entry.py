@@ -9,12 +9,17 @@ from backend.schemas.food_entry import FoodEntryCreate, FoodEntryResponse, FoodE
 from backend.crud.food_entry import food_entry_crud
 from backend.crud.daily_log import daily_log_crud
 from backend.crud.food import food_crud
+from backend.crud.loaders import Loaders
 
 router = APIRouter(
     prefix="/logs/{daily_log_id}/entries",
     tags=["food entries"]
 )
 
+# Loader presets: entries are served with their food, the log is only checked for ownership
+ENTRY_LOADERS = Loaders(joined=["food"])
+OWNED_LOG_LOADERS = Loaders(only=["id"])
+
 
 @router.post("/", response_model=FoodEntryResponse, status_code=status.HTTP_201_CREATED)
 async def create_food_entry(
@@ -24,39 +29,56 @@ async def create_food_entry(
 ):
     db, current_user = db_user
 
-    log = daily_log_crud.get_one(db, daily_log_crud._model.id == daily_log_id, user_id=current_user.id)
+    log = await daily_log_crud.aget_one(
+        db, daily_log_crud._model.id == daily_log_id, options=OWNED_LOG_LOADERS, user_id=current_user.id
+    )
     if not log:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Log not found")
 
-    food = food_crud.get_one(db, food_crud._model.id == entry.food_id)
+    # From the catalog cache; a food deleted by another worker since is
+    # still rejected by the foreign key
+    food = await food_crud.get_cached(db, entry.food_id)
     if not food:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food not found")
 
     entry_data = entry.model_dump()
     entry_data["daily_log_id"] = daily_log_id
-    return food_entry_crud.create(db, entry_data)
+    try:
+        created = await food_entry_crud.acreate(db, entry_data)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food not found") from e
+    # Around the cached food, so serializing the entry doesn't load it again
+    return FoodEntryResponse(
+        id=created.id, daily_log_id=created.daily_log_id, food_id=created.food_id, quantity=created.quantity, food=food
+    )
 
 
 @router.get("/", response_model=List[FoodEntryResponse])
 async def get_food_entries(daily_log_id: int, db_user: tuple[Session, User] = Depends(get_db_user)):
     db, current_user = db_user
 
-    log = daily_log_crud.get_one(db, daily_log_crud._model.id == daily_log_id, user_id=current_user.id)
+    log = await daily_log_crud.aget_one(
+        db, daily_log_crud._model.id == daily_log_id, options=OWNED_LOG_LOADERS, user_id=current_user.id
+    )
     if not log:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Log not found")
 
-    entries = food_entry_crud.get_many(db, limit=1000, daily_log_id=daily_log_id)
+    entries = await food_entry_crud.aget_many(db, limit=1000, options=ENTRY_LOADERS, daily_log_id=daily_log_id)
     return entries
 
 
 @router.get("/{entry_id}", response_model=FoodEntryResponse)
 async def get_food_entry(daily_log_id: int, entry_id: int, db_user: tuple[Session, User] = Depends(get_db_user)):
     db, current_user = db_user
-    log = daily_log_crud.get_one(db, daily_log_crud._model.id == daily_log_id, user_id=current_user.id)
+    log = await daily_log_crud.aget_one(
+        db, daily_log_crud._model.id == daily_log_id, options=OWNED_LOG_LOADERS, user_id=current_user.id
+    )
     if not log:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Log not found")
 
-    entry = food_entry_crud.get_one(db, food_entry_crud._model.id == entry_id, daily_log_id=daily_log_id)
+    entry = await food_entry_crud.aget_one(
+        db, food_entry_crud._model.id == entry_id, options=ENTRY_LOADERS, daily_log_id=daily_log_id
+    )
     if not entry:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food entry not found")
     return entry
@@ -71,20 +93,25 @@ async def update_food_entry(
 ):
     db, current_user = db_user
 
-    log = daily_log_crud.get_one(db, daily_log_crud._model.id == daily_log_id, user_id=current_user.id)
+    log = await daily_log_crud.aget_one(
+        db, daily_log_crud._model.id == daily_log_id, options=OWNED_LOG_LOADERS, user_id=current_user.id
+    )
     if not log:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Log not found")
 
-    existing_entry = food_entry_crud.get_one(db, food_entry_crud._model.id == entry_id, daily_log_id=daily_log_id)
+    existing_entry = await food_entry_crud.aget_one(db, food_entry_crud._model.id == entry_id, daily_log_id=daily_log_id)
     if not existing_entry:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food entry not found")
 
     if entry_update.food_id and entry_update.food_id != existing_entry.food_id:
-        food = food_crud.get_one(db, food_crud._model.id == entry_update.food_id)
+        food = await food_crud.get_cached(db, entry_update.food_id)
         if not food:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food not found")
 
-    return food_entry_crud.update(db, existing_entry, entry_update)
+    try:
+        return await food_entry_crud.aupdate(db, existing_entry, entry_update, options=ENTRY_LOADERS)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food not found") from e
 
 
 @router.delete("/{entry_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -95,13 +122,15 @@ async def delete_food_entry(
 ):
     db, current_user = db_user
 
-    log = daily_log_crud.get_one(db, daily_log_crud._model.id == daily_log_id, user_id=current_user.id)
+    log = await daily_log_crud.aget_one(
+        db, daily_log_crud._model.id == daily_log_id, options=OWNED_LOG_LOADERS, user_id=current_user.id
+    )
     if not log:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Log not found")
 
-    existing_entry = food_entry_crud.get_one(db, food_entry_crud._model.id == entry_id, daily_log_id=daily_log_id)
+    existing_entry = await food_entry_crud.aget_one(db, food_entry_crud._model.id == entry_id, daily_log_id=daily_log_id)
     if not existing_entry:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Food entry not found")
 
-    food_entry_crud.delete(db, existing_entry)
+    await food_entry_crud.adelete(db, existing_entry)
     return None
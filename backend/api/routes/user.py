@@ -1,11 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Union
 
 from backend.database.db import get_db
 from backend.api.dependancies import get_db_user_admin
+from backend.api.expand import Expand, Expansion, Relation
+from backend.api.pagination import Pagination
 from backend.models.user import User
-from backend.schemas.user import UserResponse, UserUpdate
+from backend.schemas.daily_log import DailyLogResponse
+from backend.schemas.user import UserResponse, UserExpandedResponse, UserUpdate
+from backend.schemas.pagination import Page
+from backend.crud.loaders import Loaders
 from backend.crud.user import user_crud
 
 router = APIRouter(
@@ -13,25 +18,34 @@ router = APIRouter(
     tags=["users"]
 )
 
+user_expand = Expand(
+    UserResponse,
+    logs=Relation(List[DailyLogResponse], Loaders(selectin=["logs"]))
+)
+
 
-@router.get("/", response_model=List[UserResponse])
+@router.get("/", response_model=Union[List[UserExpandedResponse], Page[UserExpandedResponse]])
 async def get_all_users(
-    skip: int = 0,
-    limit: int = 100,
-    db_user: tuple[Session, User] = Depends(get_db_user_admin)
+    pagination: Pagination = Depends(),
+    db_user: tuple[Session, User] = Depends(get_db_user_admin),
+    expansion: Expansion = Depends(user_expand)
 ):
     db, admin_user = db_user
-    users = user_crud.get_many(db, limit=limit, skip=skip)
-    return users
+    users = await pagination.fetch(user_crud, db, options=expansion.options)
+    return expansion.response(users, headers=pagination.headers, wrap=pagination.wrap)
 
 
-@router.get("/{user_id}", response_model=UserResponse)
-async def get_user_by_id(user_id: int, db_user: tuple[Session, User] = Depends(get_db_user_admin)):
+@router.get("/{user_id}", response_model=UserExpandedResponse)
+async def get_user_by_id(
+    user_id: int,
+    db_user: tuple[Session, User] = Depends(get_db_user_admin),
+    expansion: Expansion = Depends(user_expand)
+):
     db, admin_user = db_user
-    user = user_crud.get_one(db, id=user_id)
+    user = await user_crud.aget_one(db, id=user_id, options=expansion.options)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-    return user
+    return expansion.response(user)
 
 
 @router.put("/{user_id}", response_model=UserResponse)
@@ -41,21 +55,14 @@ async def update_user(
     db_user: tuple[Session, User] = Depends(get_db_user_admin)
 ):
     db, admin_user = db_user
-    existing_user = user_crud.get_one(db, id=user_id)
+    existing_user = await user_crud.aget_one(db, id=user_id)
     if not existing_user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    if user_update.email and user_update.email != existing_user.email:
-        email_exists = user_crud.get_by_email(db, user_update.email)
-        if email_exists:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
-
-    if user_update.username and user_update.username != existing_user.username:
-        username_exists = user_crud.get_by_username(db, user_update.username)
-        if username_exists:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Username already registered")
-
-    return user_crud.update(db, existing_user, user_update)
+    try:
+        return await user_crud.aupdate(db, existing_user, user_update)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -66,9 +73,9 @@ async def delete_user(user_id: int, db_user: tuple[Session, User] = Depends(get_
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cannot delete your own account"
         )
-    existing_user = user_crud.get_one(db, id=user_id)
+    existing_user = await user_crud.aget_one(db, id=user_id)
     if not existing_user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    user_crud.delete(db, existing_user)
+    await user_crud.adelete(db, existing_user)
     return None
@@ -1,2 +1,2 @@
-from .auth import get_current_user, authenticate_user
-from .security import get_password_hash, verify_password, create_access_token
\ No newline at end of file
+from .auth import get_current_user, authenticate_user, aauthenticate_user, create_user_token, revoke_access_token
+from .security import get_password_hash, verify_password, aget_password_hash, averify_password, create_access_token, decode_access_token
\ No newline at end of file
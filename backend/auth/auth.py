@@ -1,13 +1,17 @@
+from datetime import timedelta
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+from jose import JWTError
 from sqlalchemy.orm import Session
 
+from backend.config import settings
 from backend.database.db import get_db
-from backend.crud.user import user_crud
+from backend.crud.user import user_crud, user_cache, token_versions
 from backend.models.user import User
-from backend.config import settings
-from .security import verify_password
+from backend.schemas.user import UserPrincipal
+from .revocation import revocations
+from .security import verify_password, averify_password, create_access_token, decode_access_token
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/token")
 
@@ -15,36 +19,110 @@ def authenticate_user(db: Session, identifier: str, password: str):
     """
     Verify a user's credentials using username or email
     """
-    user = user_crud.get_by_username(db, identifier) or user_crud.get_by_email(db, identifier) 
+    user = user_crud.get_by_identifier(db, identifier)
     if not user or not verify_password(password, user.hashed_password):
         return None
     return user
 
-async def get_current_user(
-    db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
-):
+async def aauthenticate_user(db, identifier: str, password: str):
+    """
+    Awaitable authenticate_user for the async routes
+    """
+    user = await user_crud.aget_by_identifier(db, identifier)
+    if not user or not await averify_password(password, user.hashed_password):
+        return None
+    return user
+
+def create_user_token(user, expires_delta: Optional[timedelta] = None) -> str:
     """
-    Get the current user from their JWT token
+    Issue an access token for a User or UserPrincipal. Besides sub it carries
+    the claims stateless mode authorizes from, stamped with the token version.
     """
-    credentials_exception = HTTPException(
+    return create_access_token(
+        data={
+            "sub": user.username,
+            "uid": user.id,
+            "email": user.email,
+            "role": user.role,
+            "active": user.is_active,
+            "ver": user.token_version
+        },
+        expires_delta=expires_delta
+    )
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+async def revoke_access_token(db, token: str):
+    """
+    Revoke a token by its jti so it is refused before it expires
+    """
     try:
-        payload = jwt.decode(
-            token, 
-            settings.SECRET_KEY, 
-            algorithms=[settings.ALGORITHM]
-        )
+        payload = decode_access_token(token)
+    except JWTError:
+        raise _credentials_exception()
+    if "jti" in payload:
+        await revocations.revoke(db, payload["jti"], payload["exp"])
+
+async def get_current_user(
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme)
+) -> UserPrincipal:
+    """
+    Get the current user from their JWT token, served from the user cache when possible.
+    In stateless mode tokens carrying claims are trusted as long as their
+    version still matches the in-memory token versions.
+    """
+    credentials_exception = _credentials_exception()
+    try:
+        payload = decode_access_token(token)
         username: str = payload.get("sub")  
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+
+    # Lets the routing session keep this user's reads on the primary after a
+    # write, starting with the lookups below. A token without uid can't be
+    # matched to a writer before the user is loaded, so it reads the primary.
+    if "uid" in payload:
+        db.info["user_id"] = payload["uid"]
+    else:
+        db.info["read_only"] = False
+
+    await revocations.refresh_if_stale(db)
+    if revocations.is_revoked(payload.get("jti")):
+        raise credentials_exception
+
+    principal = await _load_principal(db, username, payload)
+    db.info["user_id"] = principal.id
+    return principal
+
+async def _load_principal(db, username: str, payload) -> UserPrincipal:
+    if settings.AUTH_STATELESS and "uid" in payload:
+        principal = UserPrincipal(
+            id=payload["uid"],
+            username=username,
+            email=payload["email"],
+            role=payload["role"],
+            is_active=payload["active"],
+            token_version=payload["ver"]
+        )
+        if await token_versions.get(db, principal.id) != principal.token_version:
+            raise _credentials_exception()
+        return principal
     
-    user = user_crud.get_by_username(db, username) 
+    principal = user_cache.get(username)
+    if principal is not None:
+        return principal
+
+    user = await user_crud.aget_by_username(db, username)
     if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+        raise _credentials_exception()
+    principal = UserPrincipal.model_validate(user)
+    user_cache.set(username, principal)
+    return principal
@@ -0,0 +1,122 @@
+import math
+import time
+from datetime import datetime, UTC
+from typing import Optional
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+
+from backend.cache import register_cache
+from backend.config import settings
+from backend.database.db import execute, resolve
+from backend.models.revoked_token import RevokedToken
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings. It never misses an added item and
+    answers false positives about error_rate of the time while it holds no
+    more than capacity items.
+    """
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / max(capacity, 1) * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Double hashing over the two halves of Python's string hash, which is
+        # cached on the str object. The seed is per process, and so is the filter.
+        h = hash(item) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        h = hash(item) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        size, bits = self.size, self._bits
+        # Most ids were never added, so bail out on the first clear bit
+        for i in range(self.hashes):
+            pos = (h1 + i * h2) % size
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+class RevocationList:
+    """
+    Revoked token ids (jti) held in memory. Lookups go through the Bloom filter
+    first, so a token that was never revoked is turned around without touching
+    the exact map; filter hits are confirmed against the map, whose entries
+    lapse at the token's exp. Revocations are persisted once and the list is
+    reloaded every REVOCATION_REFRESH_SECONDS to pick up other workers' writes.
+    """
+    def __init__(self, capacity: int, refresh_seconds: float):
+        self.capacity = capacity
+        self.refresh_seconds = refresh_seconds
+        self.refreshes = 0
+        self._bloom = BloomFilter(capacity)
+        self._expiry: dict[str, float] = {}
+        self._loaded_at: Optional[float] = None
+        register_cache("revocations", self)
+
+    def is_revoked(self, jti: Optional[str]) -> bool:
+        if jti is None or jti not in self._bloom:
+            return False
+        exp = self._expiry.get(jti)
+        return exp is not None and exp > time.time()
+
+    def add(self, jti: str, exp: float):
+        self._expiry[jti] = exp
+        self._bloom.add(jti)
+
+    async def refresh(self, db):
+        # Claimed up front so concurrent requests don't all reload at once
+        self._loaded_at = time.monotonic()
+        now = time.time()
+        stmt = select(RevokedToken.jti, RevokedToken.expires_at).filter(
+            RevokedToken.expires_at > datetime.fromtimestamp(now, UTC)
+        )
+        rows = (await execute(db, stmt)).all()
+
+        # Rebuilt rather than updated so expired ids also leave the Bloom filter.
+        # Live local entries are kept in case they were committed after the select.
+        expiry = {jti: exp for jti, exp in self._expiry.items() if exp > now}
+        expiry.update((jti, expires_at.timestamp()) for jti, expires_at in rows)
+        bloom = BloomFilter(self.capacity)
+        for jti in expiry:
+            bloom.add(jti)
+        self._bloom, self._expiry = bloom, expiry
+        self.refreshes += 1
+
+    async def refresh_if_stale(self, db):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_seconds:
+            await self.refresh(db)
+
+    async def revoke(self, db, jti: str, exp: float):
+        """
+        Persist a revocation and apply it to this process straight away
+        """
+        stmt = insert(RevokedToken).values(jti=jti, expires_at=datetime.fromtimestamp(exp, UTC))
+        await execute(db, stmt.on_conflict_do_nothing())
+        # Expired rows can't match a valid token any more, so prune them here
+        await execute(db, delete(RevokedToken).filter(RevokedToken.expires_at <= datetime.now(UTC)))
+        await resolve(db.commit())
+        self.add(jti, exp)
+
+    def clear(self):
+        self._bloom = BloomFilter(self.capacity)
+        self._expiry = {}
+        self._loaded_at = None
+        self.refreshes = 0
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._expiry),
+            "capacity": self.capacity,
+            "refresh_seconds": self.refresh_seconds,
+            "refreshes": self.refreshes
+        }
+
+revocations = RevocationList(settings.REVOCATION_BLOOM_CAPACITY, settings.REVOCATION_REFRESH_SECONDS)
@@ -1,4 +1,5 @@
 import os
+from typing import List
 from pydantic import EmailStr, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -10,6 +11,24 @@ class Settings(BaseSettings):
     POSTGRES_HOST: str = "localhost"
     POSTGRES_PORT: int = 5432
     POSTGRES_TEST_DB: str  # Added this
+    DATABASE_ASYNC: bool = False  # Use the asyncpg engine and AsyncSession in routes
+    DATABASE_RAISELOAD: bool = False  # Fail on lazy loads the route's loader preset didn't declare
+    DATABASE_UNIT_OF_WORK: bool = True  # CRUD writes flush; get_db commits once per request
+    QUERY_REPEAT_WARNING: int = 5  # Log a likely N+1 when a request runs one statement this many times
+
+    # Connection pool (per worker process)
+    DATABASE_POOL_SIZE: int = 20
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: float = 30  # Seconds to wait for a free connection before failing
+    DATABASE_POOL_RECYCLE: int = 1800  # Reconnect connections older than this, -1 never does
+    DATABASE_POOL_PRE_PING: bool = True
+    DATABASE_NULL_POOL: bool = False  # Open a connection per checkout, for PgBouncer in transaction mode
+
+    # Read replicas, as a JSON list of postgresql:// URLs. Writers are
+    # remembered per process, so with several workers a user's next request
+    # can reach one that hasn't seen their write and read from a replica.
+    DATABASE_REPLICA_URLS: List[str] = []
+    REPLICA_STICKY_SECONDS: float = 5  # Keep a user's reads on the primary this long after they write, in the same worker
 
     # pgAdmin settings
     PGADMIN_EMAIL: EmailStr
@@ -24,6 +43,25 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    AUTH_STATELESS: bool = False  # Authorize from token claims instead of loading the user
+    TOKEN_VERSION_REFRESH_SECONDS: float = 5  # How often stateless mode reloads token versions
+    REVOCATION_REFRESH_SECONDS: float = 5  # How often revoked token ids are reloaded from the database
+    REVOCATION_BLOOM_CAPACITY: int = 100000  # Revoked tokens held before false positives exceed ~1%
+
+    # Password hashing pool
+    PASSWORD_HASH_EXECUTOR: str = "thread"  # "thread" or "process"
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_SIZE: int = 64  # Jobs allowed to wait for a worker before answering 503
+
+    # Caches (a size or TTL of 0 disables them)
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: float = 30
+    TOKEN_CACHE_SIZE: int = 50000  # Entries live until their token's exp
+    FOOD_CACHE_SIZE: int = 50000  # Foods kept by id, so entry routes validate food_id without a query
+    FOOD_CACHE_TTL_SECONDS: float = 300  # How long food writes made by other workers can take to show
+    STATS_CACHE_TTL_SECONDS: float = 60  # How long /admin/stats figures are served before recounting
+    PAGE_TOTAL_ESTIMATE_ROWS: int = 100000  # Unfiltered list totals past this many rows are estimated
+    BULK_MAX_ROWS: int = 10000  # Rows accepted by one bulk request
 
     model_config = SettingsConfigDict(
         env_file=".env",
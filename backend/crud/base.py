@@ -1,48 +1,467 @@
+import re
+from typing import NamedTuple
+from sqlalchemy import column, func, insert, inspect, select, tuple_, update, values
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.crud.loaders import Loaders
+from backend.crud.pagination import InvalidCursor, PageResult, decode_cursor, encode_cursor
+from backend.database.db import in_unit_of_work
+
+class BulkResult(NamedTuple):
+    """
+    Rows written by a bulk call, as returned by the database in input order,
+    and {"index", "error"} for each input row that was rejected
+    """
+    items: list
+    errors: list[dict]
+
+def _row_error(index: int, error: Exception) -> dict:
+    message = str(error.orig) if isinstance(error, IntegrityError) else str(error)
+    # asyncpg's adapted errors are prefixed with the original exception class
+    message = re.sub(r"^<class '[\w.]+'>: ", "", message)
+    return {"index": index, "error": " ".join(message.split())}
 
 class CRUD:
     def __init__(self, model):
         self._model = model
         self._name = model.__class__.__name__
-    
-    def create(self, db: Session, schema):
-        obj_data = schema.model_dump(exclude_none=True, exclude_unset=True)
-        db_obj = self._model(**obj_data)
-        db.add(db_obj)
 
+    @staticmethod
+    def _dump(schema, **kwargs):
+        if isinstance(schema, dict):
+            return schema
+        return schema.model_dump(**kwargs)
+
+    # In unit of work mode (see get_db) writes are only flushed: the INSERT's
+    # RETURNING brings back generated keys and defaults, and the request's
+    # transaction is committed once at the end. Otherwise each call commits
+    # and refreshes the object.
+
+    def _save(self, db: Session, db_obj, action: str, refresh: bool = True):
         try:
-            db.commit()
-            db.refresh(db_obj)
+            if in_unit_of_work(db):
+                db.flush()
+            else:
+                db.commit()
+                if refresh:
+                    db.refresh(db_obj)
         except IntegrityError as e:
             db.rollback()
-            raise ValueError(f"Couldn't add {self._model.__name__}: {str(e)}")
+            raise ValueError(f"Couldn't {action} {self._model.__name__}: {str(e)}") from e
+
+    async def _asave(self, db: AsyncSession, action: str):
+        try:
+            if in_unit_of_work(db):
+                await db.flush()
+            else:
+                await db.commit()
+        except IntegrityError as e:
+            await db.rollback()
+            raise ValueError(f"Couldn't {action} {self._model.__name__}: {str(e)}") from e
+
+    def create(self, db: Session, schema):
+        obj_data = self._dump(schema, exclude_none=True, exclude_unset=True)
+        db_obj = self._model(**obj_data)
+        db.add(db_obj)
+        self._save(db, db_obj, "add")
         return db_obj
 
     def update(self, db: Session, db_obj, schema):
-        obj_data = schema.model_dump(exclude_unset=True)
+        obj_data = self._dump(schema, exclude_unset=True)
         for field, value in obj_data.items():
             setattr(db_obj, field, value)
         db.add(db_obj)
-
-        try:
-            db.commit()
-            db.refresh(db_obj)
-        except IntegrityError as e:
-            db.rollback()
-            raise ValueError(f"Couldn't update {self._model.__name__}: {str(e)}")
+        self._save(db, db_obj, "update")
         return db_obj
 
     def delete(self, db: Session, db_obj):
         db.delete(db_obj)
-        db.commit()
+        self._save(db, db_obj, "delete", refresh=False)
         return db_obj
 
-    def get_one(self, db: Session, *args, **kwargs):
-        return db.query(self._model).filter(*args).filter_by(**kwargs).first()
-    
-    def get_many(self, db: Session, limit, skip=0, *args, **kwargs):
-        return db.query(self._model).filter(*args).filter_by(**kwargs).offset(skip).limit(limit).all()
+    # Bulk writes go through Core statements with RETURNING, so each batch is
+    # one round trip and the rows come back without a refresh per object.
+    # The whole call is one transaction. The batch runs in a savepoint; when a
+    # constraint rejects it, each half is retried in its own savepoint, down to
+    # the single bad rows, which are reported. One bad row in n costs about
+    # 2 * log2(n) retries rather than n. The rest are committed, or left for
+    # get_db to commit in unit of work mode.
+
+    @property
+    def _table(self):
+        return self._model.__table__
+
+    @property
+    def _pk(self):
+        return self._table.primary_key.columns[0]
+
+    def _insert_stmt(self):
+        return insert(self._model).returning(*self._table.c, sort_by_parameter_order=True)
+
+    def _update_batches(self, rows: list[dict]):
+        """
+        One UPDATE ... FROM (VALUES ...) RETURNING per set of updated fields,
+        with the input indexes of the rows in it
+        """
+        groups: dict[tuple, list[int]] = {}
+        for index, row in enumerate(rows):
+            groups.setdefault(tuple(sorted(row)), []).append(index)
+        for keys, indexes in groups.items():
+            fields = [key for key in keys if key != self._pk.key]
+            data = values(*(column(key, self._table.c[key].type) for key in keys), name="data")
+            data = data.data([tuple(rows[index][key] for key in keys) for index in indexes])
+            stmt = (
+                update(self._table)
+                .where(self._pk == data.c[self._pk.key])
+                .values({key: data.c[key] for key in fields})
+                .returning(*self._table.c)
+            )
+            yield stmt, indexes
+
+    def _match_updates(self, rows: list[dict], indexes: list[int], returned: list, results: dict[int, object]):
+        by_pk = {getattr(row, self._pk.key): row for row in returned}
+        for index in indexes:
+            pk = rows[index][self._pk.key]
+            if pk in by_pk:
+                results[index] = by_pk[pk]
+
+    def _before_update(self, rows: list[dict]) -> list:
+        """
+        Statements to run ahead of a bulk update in its savepoint, for models
+        whose values are denormalized into other tables
+        """
+        return []
+
+    def _bulk_dump(self, schemas) -> list[dict]:
+        # Defaults are written out so every row carries the same columns
+        return [self._dump(schema, exclude_none=True) for schema in schemas]
+
+    def _collect_updates(self, rows: list[dict], results: dict[int, object], errors: list[dict] = ()) -> BulkResult:
+        """
+        Updated rows in input order; rows neither updated nor rejected weren't found
+        """
+        rejected = {error["index"]: error for error in errors}
+        items, errors = [], []
+        for index, row in enumerate(rows):
+            if index in results:
+                items.append(results[index])
+            elif index in rejected:
+                errors.append(rejected[index])
+            else:
+                errors.append(_row_error(index, LookupError(f"{self._model.__name__} {row[self._pk.key]} not found")))
+        return BulkResult(items, errors)
+
+    def _check_update_rows(self, rows: list[dict]):
+        # A repeated key would be written once but seen twice by anything
+        # computed from the batch, such as food repricing
+        seen = set()
+        for index, row in enumerate(rows):
+            if self._pk.key not in row:
+                raise ValueError(f"Row {index} has no {self._pk.key}")
+            if row[self._pk.key] in seen:
+                raise ValueError(f"Row {index} repeats {self._pk.key} {row[self._pk.key]}")
+            seen.add(row[self._pk.key])
+
+    def _write_halves(self, db: Session, indexes: list[int], write, results: dict, errors: list[dict]):
+        """
+        Run write(indexes), which returns {index: row}, in a savepoint; when a
+        constraint rejects it, split the rows in two and try each half
+        """
+        try:
+            with db.begin_nested():
+                written = write(indexes)
+        except IntegrityError as e:
+            if len(indexes) == 1:
+                errors.append(_row_error(indexes[0], e))
+                return
+            middle = len(indexes) // 2
+            self._write_halves(db, indexes[:middle], write, results, errors)
+            self._write_halves(db, indexes[middle:], write, results, errors)
+            return
+        results.update(written)
+
+    async def _awrite_halves(self, db: AsyncSession, indexes: list[int], write, results: dict, errors: list[dict]):
+        try:
+            async with db.begin_nested():
+                written = await write(indexes)
+        except IntegrityError as e:
+            if len(indexes) == 1:
+                errors.append(_row_error(indexes[0], e))
+                return
+            middle = len(indexes) // 2
+            await self._awrite_halves(db, indexes[:middle], write, results, errors)
+            await self._awrite_halves(db, indexes[middle:], write, results, errors)
+            return
+        results.update(written)
+
+    def _update_written(self, rows: list[dict], indexes: list[int], batches) -> dict:
+        """
+        {input index: updated row} from the results of _update_batches over
+        the rows at indexes
+        """
+        written = {}
+        for returned, positions in batches:
+            self._match_updates([rows[index] for index in indexes], positions, returned, written)
+        return {indexes[position]: row for position, row in written.items()}
+
+    @staticmethod
+    def _commit(db: Session):
+        if not in_unit_of_work(db):
+            db.commit()
+
+    @staticmethod
+    async def _acommit(db: AsyncSession):
+        if not in_unit_of_work(db):
+            await db.commit()
+
+    def bulk_create(self, db: Session, schemas) -> BulkResult:
+        rows = self._bulk_dump(schemas)
+        if not rows:
+            return BulkResult([], [])
+
+        def write(indexes):
+            return dict(zip(indexes, db.execute(self._insert_stmt(), [rows[index] for index in indexes]).all()))
+
+        results, errors = {}, []
+        self._write_halves(db, list(range(len(rows))), write, results, errors)
+        self._commit(db)
+        return BulkResult([results[index] for index in sorted(results)], errors)
+
+    def bulk_update(self, db: Session, rows: list[dict]) -> BulkResult:
+        """
+        Update rows given as dicts of the primary key and the fields to change
+        """
+        rows = [self._dump(row, exclude_unset=True) for row in rows]
+        self._check_update_rows(rows)
+
+        def write(indexes):
+            batch = [rows[index] for index in indexes]
+            for stmt in self._before_update(batch):
+                db.execute(stmt)
+            batches = [(db.execute(stmt).all(), positions) for stmt, positions in self._update_batches(batch)]
+            return self._update_written(rows, indexes, batches)
+
+        results, errors = {}, []
+        self._write_halves(db, list(range(len(rows))), write, results, errors)
+        self._commit(db)
+        return self._collect_updates(rows, results, errors)
+
+    def _options(self, options) -> list:
+        """
+        Loader options for a read: a Loaders preset, or raw options as they are
+        """
+        if isinstance(options, Loaders):
+            return options.options(self._model)
+        return list(options or ())
+
+    def _order_key(self, order_by: str = None) -> tuple:
+        """
+        Columns a page is sorted on: order_by, if given, then the primary key
+        so rows with equal values still have a stable order
+        """
+        mapper = inspect(self._model)
+        pk = getattr(self._model, mapper.get_property_by_column(mapper.primary_key[0]).key)
+        if order_by is None or order_by == pk.key:
+            return (pk,)
+        if order_by not in mapper.column_attrs:
+            raise ValueError(f"Can't order {self._model.__name__} by {order_by}")
+        return (getattr(self._model, order_by), pk)
+
+    @staticmethod
+    def _cursor_value(column, value):
+        """
+        A decoded cursor value as its key column's Python type, so a tampered
+        cursor is rejected here rather than by the database
+        """
+        python_type = column.type.python_type
+        if value is None and column.nullable:
+            return None
+        # Dates and datetimes are encoded as ISO strings
+        if isinstance(value, str) and hasattr(python_type, "fromisoformat"):
+            try:
+                return python_type.fromisoformat(value)
+            except ValueError as e:
+                raise InvalidCursor("Invalid cursor") from e
+        # JSON numbers decode as int or float, and bool is an int in Python
+        if isinstance(value, bool):
+            raise InvalidCursor("Invalid cursor")
+        if python_type is float and isinstance(value, int):
+            return float(value)
+        if not isinstance(value, python_type):
+            raise InvalidCursor("Invalid cursor")
+        return value
+
+    @classmethod
+    def _after(cls, key: tuple, cursor: str):
+        """
+        Keyset filter for rows sorted after the cursor
+        """
+        values = decode_cursor(cursor, len(key))
+        values = [cls._cursor_value(column, value) for column, value in zip(key, values)]
+        return tuple_(*key) > tuple_(*values)
+
+    def _count_stmt(self, args, kwargs):
+        return select(func.count()).select_from(self._model).filter(*args).filter_by(**kwargs)
+
+    def _total_column(self, args, kwargs, cursor):
+        """
+        Total row count carried on every row of a page. A window counts the rows
+        the page is cut from; past a cursor those are only the rows after it,
+        so the count is an uncorrelated subquery Postgres runs once instead.
+        """
+        if cursor:
+            return self._count_stmt(args, kwargs).correlate(None).scalar_subquery().label("total")
+        return func.count().over().label("total")
+
+    @staticmethod
+    def _page(rows: list, key: tuple, limit: int, with_total: bool) -> PageResult:
+        """
+        Trim the lookahead row off a page; its presence means there's a next page
+        """
+        items = [row[0] for row in rows] if with_total else list(rows)
+        total = rows[0][1] if with_total and rows else None
+        if len(items) <= limit:
+            return PageResult(items, None, total)
+        items = items[:limit]
+        return PageResult(items, encode_cursor([getattr(items[-1], column.key) for column in key]), total)
+
+    def get_one(self, db: Session, *args, options=None, **kwargs):
+        return db.query(self._model).options(*self._options(options)).filter(*args).filter_by(**kwargs).first()
+
+    def get_many(self, db: Session, limit, skip=0, *args, options=None, **kwargs):
+        query = db.query(self._model).options(*self._options(options)).filter(*args).filter_by(**kwargs)
+        return query.order_by(*self._order_key()).offset(skip).limit(limit).all()
+
+    def get_page(self, db: Session, limit, *args, cursor=None, skip=0, order_by=None, options=None,
+                 with_total=False, **kwargs):
+        """
+        A page of rows and the cursor of the next one (None on the last page).
+        With a cursor, the page starts after the row it was taken from, which
+        an index on the order column finds directly; skip still works on top.
+        with_total also counts every matching row in the same statement.
+        Raises InvalidCursor for a cursor that wasn't produced by this ordering.
+        """
+        key = self._order_key(order_by)
+        query = db.query(self._model).options(*self._options(options)).filter(*args).filter_by(**kwargs)
+        if with_total:
+            query = query.add_columns(self._total_column(args, kwargs, cursor))
+        if cursor:
+            query = query.filter(self._after(key, cursor))
+        page = self._page(query.order_by(*key).offset(skip).limit(limit + 1).all(), key, limit, with_total)
+        if with_total and page.total is None:
+            # An empty page carries no count; past the end of the rows it needs its own query
+            page = page._replace(total=db.scalar(self._count_stmt(args, kwargs)) if cursor or skip else 0)
+        return page
+
+    def get_many_from_user(self, db: Session, limit, id, skip=0, *args, options=None, **kwargs):
+        return self.get_many(db, limit, skip, *args, options=options, user_id=id, **kwargs)
+
+    # Awaitable equivalents used by the async routes. A sync Session is handed
+    # straight to the methods above, an AsyncSession goes through select().
+    # Like the sync reads they load no relationships unless options name
+    # them; an AsyncSession can't lazy load, so routes that serialize a
+    # relation pass a Loaders preset.
+
+    async def _reload(self, db: AsyncSession, db_obj, options=None):
+        pk = inspect(self._model).primary_key[0]
+        stmt = (
+            select(self._model)
+            .filter(pk == getattr(db_obj, pk.key))
+            .options(*self._options(options))
+            .execution_options(populate_existing=True)
+        )
+        return (await db.execute(stmt)).scalars().one()
+
+    async def acreate(self, db, schema, options=None):
+        if not isinstance(db, AsyncSession):
+            return self.create(db, schema)
+        obj_data = self._dump(schema, exclude_none=True, exclude_unset=True)
+        db_obj = self._model(**obj_data)
+        db.add(db_obj)
+        await self._asave(db, "add")
+        return await self._reload(db, db_obj, options)
+
+    async def aupdate(self, db, db_obj, schema, options=None):
+        if not isinstance(db, AsyncSession):
+            return self.update(db, db_obj, schema)
+        obj_data = self._dump(schema, exclude_unset=True)
+        for field, value in obj_data.items():
+            setattr(db_obj, field, value)
+        db.add(db_obj)
+        await self._asave(db, "update")
+        return await self._reload(db, db_obj, options)
+
+    async def adelete(self, db, db_obj):
+        if not isinstance(db, AsyncSession):
+            return self.delete(db, db_obj)
+        await db.delete(db_obj)
+        await self._asave(db, "delete")
+        return db_obj
+
+    async def abulk_create(self, db, schemas) -> BulkResult:
+        if not isinstance(db, AsyncSession):
+            return self.bulk_create(db, schemas)
+        rows = self._bulk_dump(schemas)
+        if not rows:
+            return BulkResult([], [])
+
+        async def write(indexes):
+            returned = (await db.execute(self._insert_stmt(), [rows[index] for index in indexes])).all()
+            return dict(zip(indexes, returned))
+
+        results, errors = {}, []
+        await self._awrite_halves(db, list(range(len(rows))), write, results, errors)
+        await self._acommit(db)
+        return BulkResult([results[index] for index in sorted(results)], errors)
+
+    async def abulk_update(self, db, rows: list[dict]) -> BulkResult:
+        if not isinstance(db, AsyncSession):
+            return self.bulk_update(db, rows)
+        rows = [self._dump(row, exclude_unset=True) for row in rows]
+        self._check_update_rows(rows)
+
+        async def write(indexes):
+            batch = [rows[index] for index in indexes]
+            for stmt in self._before_update(batch):
+                await db.execute(stmt)
+            batches = [((await db.execute(stmt)).all(), positions) for stmt, positions in self._update_batches(batch)]
+            return self._update_written(rows, indexes, batches)
+
+        results, errors = {}, []
+        await self._awrite_halves(db, list(range(len(rows))), write, results, errors)
+        await self._acommit(db)
+        return self._collect_updates(rows, results, errors)
+
+    async def aget_one(self, db, *args, options=None, **kwargs):
+        if not isinstance(db, AsyncSession):
+            return self.get_one(db, *args, options=options, **kwargs)
+        stmt = select(self._model).filter(*args).filter_by(**kwargs).options(*self._options(options)).limit(1)
+        return (await db.execute(stmt)).scalars().first()
+
+    async def aget_many(self, db, limit, skip=0, *args, options=None, **kwargs):
+        if not isinstance(db, AsyncSession):
+            return self.get_many(db, limit, skip, *args, options=options, **kwargs)
+        stmt = select(self._model).filter(*args).filter_by(**kwargs).options(*self._options(options))
+        stmt = stmt.order_by(*self._order_key()).offset(skip).limit(limit)
+        return (await db.execute(stmt)).scalars().all()
 
-    def get_many_from_user(self, db: Session, limit, id, skip=0, *args, **kwargs):
-        return self.get_many(db, limit=limit, skip=skip, *args, user_id=id, **kwargs)
\ No newline at end of file
+    async def aget_page(self, db, limit, *args, cursor=None, skip=0, order_by=None, options=None,
+                        with_total=False, **kwargs):
+        if not isinstance(db, AsyncSession):
+            return self.get_page(
+                db, limit, *args, cursor=cursor, skip=skip, order_by=order_by, options=options,
+                with_total=with_total, **kwargs
+            )
+        key = self._order_key(order_by)
+        stmt = select(self._model).filter(*args).filter_by(**kwargs).options(*self._options(options))
+        if with_total:
+            stmt = stmt.add_columns(self._total_column(args, kwargs, cursor))
+        if cursor:
+            stmt = stmt.filter(self._after(key, cursor))
+        stmt = stmt.order_by(*key).offset(skip).limit(limit + 1)
+        result = await db.execute(stmt)
+        page = self._page(result.all() if with_total else result.scalars().all(), key, limit, with_total)
+        if with_total and page.total is None:
+            page = page._replace(total=await db.scalar(self._count_stmt(args, kwargs)) if cursor or skip else 0)
+        return page
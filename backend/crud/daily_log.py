@@ -1,4 +1,143 @@
+import datetime
+from sqlalchemy import Date, cast, exists, false, func, select, true, union_all
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.ext.asyncio import AsyncSession
 from .base import CRUD
+from .totals import TOTAL_COLUMNS
+from backend.database.routing import mark_write
 from backend.models import DailyLog
 
-daily_log_crud = CRUD(model=DailyLog)
+class DailyLogCRUD(CRUD):
+    def __init__(self):
+        super().__init__(DailyLog)
+
+    def _get_or_create_stmt(self, user_id: int, log_date: datetime.date):
+        # The insert skips an existing log without touching it, and the
+        # select returns that log instead; the two arms share a snapshot
+        table = self._model.__table__
+        inserted = (
+            insert(self._model).values(user_id=user_id, date=log_date)
+            .on_conflict_do_nothing(constraint="_user_date_uc")
+            .returning(*table.c, true().label("created"))
+            .cte("inserted")
+        )
+        existing = (
+            select(*table.c, false().label("created"))
+            .filter(table.c.user_id == user_id, table.c.date == log_date, ~exists(inserted.select()))
+        )
+        rows = union_all(inserted.select(), existing).subquery("log")
+        return (
+            select(aliased(self._model, rows), rows.c.created)
+            .execution_options(populate_existing=True)
+        )
+
+    # One statement, so concurrent requests for the same day can't both miss
+    # the log and then collide on the unique constraint. A log committed by a
+    # concurrent insert after the statement's snapshot is skipped by both
+    # arms, and found by running it again.
+    def get_or_create(self, db: Session, user_id: int, log_date: datetime.date) -> tuple[DailyLog, bool]:
+        """
+        The user's log for a date, created if missing, and whether it was created
+        """
+        stmt = self._get_or_create_stmt(user_id, log_date)
+        row = db.execute(stmt).one_or_none() or db.execute(stmt).one()
+        log, created = row
+        if created:
+            mark_write(db)
+        self._commit(db)
+        return log, created
+
+    async def aget_or_create(self, db, user_id: int, log_date: datetime.date) -> tuple[DailyLog, bool]:
+        if not isinstance(db, AsyncSession):
+            return self.get_or_create(db, user_id, log_date)
+        stmt = self._get_or_create_stmt(user_id, log_date)
+        row = (await db.execute(stmt)).one_or_none() or (await db.execute(stmt)).one()
+        log, created = row
+        if created:
+            mark_write(db.sync_session)
+        await self._acommit(db)
+        return log, created
+
+    def _by_dates_query(self, user_id: int, dates, options):
+        # Served by the (user_id, date) unique index
+        return (
+            select(self._model)
+            .filter(self._model.user_id == user_id, self._model.date.in_(dates))
+            .options(*self._options(options))
+            .order_by(self._model.date)
+        )
+
+    # Joined collection loads repeat each log once per entry, unique() folds them back
+    def get_by_dates(self, db: Session, user_id: int, dates, options=None) -> list[DailyLog]:
+        """
+        The user's logs on any of the dates, oldest first; missing days are skipped
+        """
+        return db.execute(self._by_dates_query(user_id, dates, options)).scalars().unique().all()
+
+    async def aget_by_dates(self, db, user_id: int, dates, options=None) -> list[DailyLog]:
+        if not isinstance(db, AsyncSession):
+            return self.get_by_dates(db, user_id, dates, options=options)
+        return (await db.execute(self._by_dates_query(user_id, dates, options))).scalars().unique().all()
+
+    def _totals_query(self, filters):
+        return select(self._model.id, *TOTAL_COLUMNS.values()).filter(*filters)
+
+    @staticmethod
+    def _totals(rows) -> dict[int, dict]:
+        return {row.id: {name: row._mapping[total.key] for name, total in TOTAL_COLUMNS.items()} for row in rows}
+
+    def get_totals(self, db: Session, *filters) -> dict[int, dict]:
+        """
+        Nutrient totals of each log matching filters, keyed by log id, as
+        maintained on the log
+        """
+        return self._totals(db.execute(self._totals_query(filters)).all())
+
+    async def aget_totals(self, db, *filters) -> dict[int, dict]:
+        if not isinstance(db, AsyncSession):
+            return self.get_totals(db, *filters)
+        return self._totals((await db.execute(self._totals_query(filters))).all())
+
+    def _summary_query(self, user_id: int, start: datetime.date, end: datetime.date, bucket: str):
+        # A range scan of the (user_id, date) index; the stored totals mean
+        # entries and foods aren't read at all
+        period = cast(func.date_trunc(bucket, self._model.date), Date).label("start")
+        return (
+            select(
+                period,
+                func.count().label("days_logged"),
+                *(func.sum(total).label(name) for name, total in TOTAL_COLUMNS.items()),
+                *(func.avg(total).label(f"average_{name}") for name, total in TOTAL_COLUMNS.items())
+            )
+            .filter(self._model.user_id == user_id, self._model.date.between(start, end))
+            .group_by(period)
+            .order_by(period)
+        )
+
+    @staticmethod
+    def _summary(rows) -> list[dict]:
+        return [
+            {
+                "start": row.start,
+                "days_logged": row.days_logged,
+                "totals": {name: row._mapping[name] for name in TOTAL_COLUMNS},
+                "averages": {name: row._mapping[f"average_{name}"] for name in TOTAL_COLUMNS}
+            }
+            for row in rows
+        ]
+
+    def get_summary(self, db: Session, user_id: int, start: datetime.date, end: datetime.date, bucket: str) -> list[dict]:
+        """
+        The user's totals and per logged day averages between start and end
+        inclusive, per day, week (from Monday) or month; periods without logs
+        are left out
+        """
+        return self._summary(db.execute(self._summary_query(user_id, start, end, bucket)).all())
+
+    async def aget_summary(self, db, user_id: int, start: datetime.date, end: datetime.date, bucket: str) -> list[dict]:
+        if not isinstance(db, AsyncSession):
+            return self.get_summary(db, user_id, start, end, bucket)
+        return self._summary((await db.execute(self._summary_query(user_id, start, end, bucket))).all())
+
+daily_log_crud = DailyLogCRUD()
@@ -1,4 +1,111 @@
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.cache import TTLCache
+from backend.config import settings
+from backend.database.db import on_commit
 from .base import CRUD
+from .totals import bulk_reprice_stmt
 from backend.models.food import Food
+from backend.schemas.food import FoodResponse
 
-food_crud = CRUD(model=Food)
+# FoodResponse snapshots keyed by food id, filled on first lookup. Writes in
+# this process refresh them once committed; the TTL bounds how long writes
+# made by other workers take to show.
+food_cache = TTLCache("foods", settings.FOOD_CACHE_SIZE, settings.FOOD_CACHE_TTL_SECONDS)
+
+class FoodCRUD(CRUD):
+    def __init__(self):
+        super().__init__(Food)
+
+    async def get_cached(self, db, food_id: int) -> Optional[FoodResponse]:
+        """
+        A food by id from the catalog cache, read from the database on a miss
+        """
+        food = food_cache.get(food_id)
+        if food is None:
+            db_obj = await self.aget_one(db, self._model.id == food_id)
+            if db_obj is None:
+                return None
+            food = FoodResponse.model_validate(db_obj)
+            food_cache.set(food_id, food)
+        return food
+
+    # Like users, a food is dropped before the write and its new values are
+    # cached once it commits, so a read racing the write can't outlive it
+    def _cache(self, db, db_objs):
+        foods = [FoodResponse.model_validate(db_obj) for db_obj in db_objs]
+
+        def cache():
+            for food in foods:
+                food_cache.set(food.id, food)
+        on_commit(db, cache)
+
+    def _evict(self, db, food_id: int):
+        on_commit(db, lambda: food_cache.pop(food_id))
+
+    def create(self, db, schema):
+        db_obj = super().create(db, schema)
+        self._cache(db, [db_obj])
+        return db_obj
+
+    async def acreate(self, db, schema):
+        if not isinstance(db, AsyncSession):
+            return self.create(db, schema)
+        db_obj = await super().acreate(db, schema)
+        self._cache(db, [db_obj])
+        return db_obj
+
+    def update(self, db, db_obj, schema):
+        food_cache.pop(db_obj.id)
+        db_obj = super().update(db, db_obj, schema)
+        self._cache(db, [db_obj])
+        return db_obj
+
+    async def aupdate(self, db, db_obj, schema):
+        if not isinstance(db, AsyncSession):
+            return self.update(db, db_obj, schema)
+        food_cache.pop(db_obj.id)
+        db_obj = await super().aupdate(db, db_obj, schema)
+        self._cache(db, [db_obj])
+        return db_obj
+
+    def delete(self, db, db_obj):
+        food_id = db_obj.id
+        food_cache.pop(food_id)
+        db_obj = super().delete(db, db_obj)
+        self._evict(db, food_id)
+        return db_obj
+
+    async def adelete(self, db, db_obj):
+        if not isinstance(db, AsyncSession):
+            return self.delete(db, db_obj)
+        food_id = db_obj.id
+        food_cache.pop(food_id)
+        db_obj = await super().adelete(db, db_obj)
+        self._evict(db, food_id)
+        return db_obj
+
+    # ORM updates reprice log totals from a flush event; bulk updates are
+    # Core statements, so they reprice before writing the new values
+    def _before_update(self, rows: list[dict]) -> list:
+        stmt = bulk_reprice_stmt(rows)
+        return [] if stmt is None else [stmt]
+
+    # The updated rows come back from RETURNING with every column
+    def bulk_update(self, db, rows):
+        for row in rows:
+            food_cache.pop(self._dump(row)["id"])
+        result = super().bulk_update(db, rows)
+        self._cache(db, result.items)
+        return result
+
+    async def abulk_update(self, db, rows):
+        if not isinstance(db, AsyncSession):
+            return self.bulk_update(db, rows)
+        for row in rows:
+            food_cache.pop(self._dump(row)["id"])
+        result = await super().abulk_update(db, rows)
+        self._cache(db, result.items)
+        return result
+
+food_crud = FoodCRUD()
@@ -0,0 +1,44 @@
+from typing import Iterable
+from sqlalchemy import inspect
+from sqlalchemy.orm import defaultload, joinedload, load_only, raiseload, selectinload
+
+from backend.config import settings
+
+class Loaders:
+    """
+    Declarative eager-loading preset for CRUD reads. Relationship paths are
+    dotted names from the queried model, e.g. "food_entries.food", loaded with
+    selectinload or joinedload; only= restricts the model's own columns with
+    load_only. When settings.DATABASE_RAISELOAD is on, every relationship the
+    preset doesn't name raises on access instead of lazy loading.
+    """
+    def __init__(self, selectin: Iterable[str] = (), joined: Iterable[str] = (), only: Iterable[str] = ()):
+        self.selectin = tuple(selectin)
+        self.joined = tuple(joined)
+        self.only = tuple(only)
+
+    def __add__(self, other: "Loaders") -> "Loaders":
+        return Loaders(self.selectin + other.selectin, self.joined + other.joined, self.only + other.only)
+
+    def options(self, model) -> list:
+        strategies = {path: selectinload for path in self.selectin}
+        strategies.update({path: joinedload for path in self.joined})
+        raise_others = settings.DATABASE_RAISELOAD
+
+        options = []
+        if self.only:
+            options.append(load_only(*(getattr(model, column) for column in self.only)))
+        if raise_others:
+            options.append(raiseload("*"))
+
+        for path in strategies:
+            chain, mapper, prefix = None, inspect(model), []
+            for name in path.split("."):
+                prefix.append(name)
+                # Parents named on their own keep their strategy, others are left as they are
+                strategy = strategies.get(".".join(prefix), defaultload)
+                attribute = mapper.relationships[name].class_attribute
+                chain = strategy(attribute) if chain is None else getattr(chain, strategy.__name__)(attribute)
+                mapper = mapper.relationships[name].mapper
+            options.append(chain.raiseload("*") if raise_others else chain)
+        return options
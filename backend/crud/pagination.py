@@ -0,0 +1,29 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from typing import NamedTuple, Optional
+
+class InvalidCursor(ValueError):
+    pass
+
+class PageResult(NamedTuple):
+    items: list
+    next_cursor: Optional[str]
+    total: Optional[int] = None
+
+def encode_cursor(values) -> str:
+    """
+    Opaque cursor holding the sort key of the last row of a page
+    """
+    values = [value.isoformat() if isinstance(value, (date, datetime)) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Invalid cursor")
+    return values
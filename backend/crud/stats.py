@@ -0,0 +1,98 @@
+import time
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import case, cast, column, func, select, table
+from sqlalchemy.dialects.postgresql import REGCLASS
+from backend.cache import TTLCache
+from backend.config import settings
+from backend.database.db import execute
+from backend.models import DailyLog, Food, FoodEntry, User
+
+pg_class = table("pg_class", column("oid"), column("reltuples"))
+
+# Table-wide totals that approximate mode reads from the planner's statistics
+ESTIMATED_TOTALS = {
+    "total_foods": Food,
+    "total_daily_logs": DailyLog,
+    "total_food_entries": FoodEntry,
+}
+
+def _reltuples(model):
+    """
+    The planner's row estimate for a model's table, -1 if never analyzed
+    """
+    return (
+        select(pg_class.c.reltuples)
+        .filter(pg_class.c.oid == cast(model.__tablename__, REGCLASS))
+        .scalar_subquery()
+    )
+
+class SystemStats:
+    """
+    System-wide counts for /admin/stats, gathered in a single statement and
+    cached for STATS_CACHE_TTL_SECONDS. In approximate mode the large tables
+    are counted from pg_class.reltuples, which ANALYZE and autovacuum keep
+    current, instead of a full scan; tables never analyzed are still counted.
+    """
+    def __init__(self, ttl: float):
+        self._cache = TTLCache("system_stats", 2, ttl)
+
+    async def get(self, db, approximate: bool = False) -> dict:
+        cached = self._cache.get(approximate)
+        if cached is None:
+            cached = await self._compute(db, approximate)
+            self._cache.set(approximate, cached)
+        computed_at, timestamp, counts, exact = cached
+        return {
+            "counts": counts,
+            "exact": exact,
+            "timestamp": timestamp,
+            "age_seconds": round(time.monotonic() - computed_at, 3)
+        }
+
+    async def _compute(self, db, approximate: bool) -> tuple:
+        columns = [
+            func.count().label("total_users"),
+            func.count().filter(User.is_active == True).label("active_users"),
+            func.count().filter(User.role == "admin").label("admin_users"),
+        ]
+        for name, model in ESTIMATED_TOTALS.items():
+            exact_count = select(func.count()).select_from(model).scalar_subquery()
+            if approximate:
+                # -1 means the table hasn't been analyzed yet; the exact count
+                # is an InitPlan, so Postgres only runs it in that case
+                reltuples = _reltuples(model)
+                columns.append(reltuples.label(f"{name}_reltuples"))
+                columns.append(case((reltuples >= 0, func.round(reltuples)), else_=exact_count).label(name))
+            else:
+                columns.append(exact_count.label(name))
+
+        row = (await execute(db, select(*columns).select_from(User))).one()
+        counts = {label: int(row._mapping[label]) for label in ("total_users", "active_users", "admin_users", *ESTIMATED_TOTALS)}
+        exact = {
+            label: not approximate or label not in ESTIMATED_TOTALS or row._mapping[f"{label}_reltuples"] < 0
+            for label in counts
+        }
+        return time.monotonic(), datetime.now().isoformat(), counts, exact
+
+class RowEstimates:
+    """
+    Cached planner row estimates per table, so list totals on big tables
+    don't need a count
+    """
+    def __init__(self, ttl: float):
+        self._cache = TTLCache("row_estimates", 64, ttl)
+
+    async def get(self, db, model) -> Optional[int]:
+        """
+        Estimated rows in the model's table, or None if it hasn't been analyzed
+        """
+        estimate = self._cache.get(model.__tablename__)
+        if estimate is None:
+            estimate = (await execute(db, select(_reltuples(model)))).scalar_one()
+            estimate = -1 if estimate is None else round(estimate)
+            self._cache.set(model.__tablename__, estimate)
+        return None if estimate < 0 else estimate
+
+system_stats = SystemStats(settings.STATS_CACHE_TTL_SECONDS)
+row_estimates = RowEstimates(settings.STATS_CACHE_TTL_SECONDS)
@@ -0,0 +1,185 @@
+from sqlalchemy import Float, Integer, cast, column, event, func, inspect, select, update, values
+from sqlalchemy.orm import Session, attributes, object_session
+from backend.models import DailyLog, Food, FoodEntry
+from backend.models.daily_log import NUTRIENTS
+
+# DailyLog.total_<nutrient> holds SUM(quantity * food.<nutrient>) over the
+# log's entries. Entry writes through the ORM adjust it by the change alone,
+# in the same flush; food changes move every log that uses the food by
+# quantity times the change. reconcile() recomputes the sums to repair drift
+# from writes that went around both, e.g. raw SQL.
+
+TOTAL_COLUMNS = {name: getattr(DailyLog, f"total_{name}") for name in NUTRIENTS}
+
+# Stored sums this close to the recomputed ones haven't drifted
+DRIFT_TOLERANCE = 1e-6
+
+def _sync_loaded(session: Session, rows):
+    # Objects already loaded for a log keep serving its new sums
+    for row in rows:
+        log = session.identity_map.get(session.identity_key(DailyLog, row.id)) if session else None
+        if log is not None:
+            for name, total in TOTAL_COLUMNS.items():
+                attributes.set_committed_value(log, total.key, row._mapping[total.key])
+
+def _adjust_stmt(log_id: int, changes: list[tuple[int, float]]):
+    """
+    Add quantity * food values to a log's totals for each (food_id, quantity)
+    change; removed entries are negative quantities
+    """
+    data = values(column("food_id", Integer), column("quantity", Float), name="changes").data(changes)
+
+    def delta(name):
+        return (
+            select(func.coalesce(func.sum(data.c.quantity * getattr(Food, name)), 0))
+            .select_from(data)
+            .join(Food, Food.id == data.c.food_id)
+            .scalar_subquery()
+        )
+
+    return (
+        update(DailyLog)
+        .where(DailyLog.id == log_id)
+        .values({total.key: total + delta(name) for name, total in TOTAL_COLUMNS.items()})
+        .returning(DailyLog.id, *TOTAL_COLUMNS.values())
+    )
+
+def _adjust(connection, target, changes: dict[int, list[tuple[int, float]]]):
+    for log_id, log_changes in changes.items():
+        rows = connection.execute(_adjust_stmt(log_id, log_changes)).all()
+        _sync_loaded(object_session(target), rows)
+
+def _previous(target, key: str):
+    history = inspect(target).attrs[key].history
+    return history.deleted[0] if history.deleted else getattr(target, key)
+
+@event.listens_for(FoodEntry, "after_insert")
+def _entry_inserted(mapper, connection, target):
+    _adjust(connection, target, {target.daily_log_id: [(target.food_id, target.quantity)]})
+
+@event.listens_for(FoodEntry, "after_update")
+def _entry_updated(mapper, connection, target):
+    old = tuple(_previous(target, key) for key in ("daily_log_id", "food_id", "quantity"))
+    new = (target.daily_log_id, target.food_id, target.quantity)
+    if old == new:
+        return
+    changes: dict[int, list] = {}
+    changes.setdefault(old[0], []).append((old[1], -old[2]))
+    changes.setdefault(new[0], []).append((new[1], new[2]))
+    _adjust(connection, target, changes)
+
+def _log_deleted(target) -> bool:
+    # Entries removed by cascade from a log deleted in the same flush
+    session = object_session(target)
+    log = session.identity_map.get(session.identity_key(DailyLog, target.daily_log_id)) if session else None
+    return log is not None and log in session.deleted
+
+@event.listens_for(FoodEntry, "after_delete")
+def _entry_deleted(mapper, connection, target):
+    if _log_deleted(target):
+        return
+    _adjust(connection, target, {target.daily_log_id: [(target.food_id, -target.quantity)]})
+
+def reprice_stmt(deltas):
+    """
+    Move the totals of every log with entries of a food by quantity times the
+    change in its values. deltas is a selectable of food_id and one column
+    per nutrient holding the change.
+    """
+    per_log = (
+        select(
+            FoodEntry.daily_log_id,
+            *(func.sum(FoodEntry.quantity * deltas.c[name]).label(name) for name in NUTRIENTS)
+        )
+        .join(deltas, deltas.c.food_id == FoodEntry.food_id)
+        .group_by(FoodEntry.daily_log_id)
+        .subquery()
+    )
+    return (
+        update(DailyLog)
+        .where(DailyLog.id == per_log.c.daily_log_id)
+        .values({total.key: total + per_log.c[name] for name, total in TOTAL_COLUMNS.items()})
+        .returning(DailyLog.id, *TOTAL_COLUMNS.values())
+    )
+
+def bulk_reprice_stmt(rows: list[dict]):
+    """
+    reprice_stmt for food rows about to be updated to rows' values, diffed
+    against the stored ones in SQL; None if no row changes a nutrient
+    """
+    rows = [row for row in rows if any(name in row for name in NUTRIENTS)]
+    if not rows:
+        return None
+    data = values(column("id", Integer), *(column(name, Float) for name in NUTRIENTS), name="data")
+    data = data.data([(row["id"], *(row.get(name) for name in NUTRIENTS)) for row in rows])
+    deltas = (
+        select(
+            Food.id.label("food_id"),
+            # A column of only NULLs would be typed text without the cast
+            *(func.coalesce(cast(data.c[name], Float) - getattr(Food, name), 0).label(name) for name in NUTRIENTS)
+        )
+        .join(data, data.c.id == Food.id)
+        .subquery()
+    )
+    return reprice_stmt(deltas)
+
+@event.listens_for(Food, "after_update")
+def _food_updated(mapper, connection, target):
+    changes = {name: getattr(target, name) - _previous(target, name) for name in NUTRIENTS}
+    if not any(changes.values()):
+        return
+    data = values(column("food_id", Integer), *(column(name, Float) for name in NUTRIENTS), name="deltas")
+    data = data.data([(target.id, *changes.values())])
+    rows = connection.execute(reprice_stmt(data)).all()
+    _sync_loaded(object_session(target), rows)
+
+def summed_totals(*filters):
+    """
+    The totals recomputed from the entries, one row per log matching filters
+    """
+    return (
+        select(
+            DailyLog.id,
+            *(func.coalesce(func.sum(FoodEntry.quantity * getattr(Food, name)), 0).label(name) for name in NUTRIENTS)
+        )
+        .outerjoin(FoodEntry, FoodEntry.daily_log_id == DailyLog.id)
+        .outerjoin(Food, Food.id == FoodEntry.food_id)
+        .filter(*filters)
+        .group_by(DailyLog.id)
+    )
+
+def reconcile(db: Session, batch_size: int = 10000, dry_run: bool = False) -> int:
+    """
+    Recompute the totals of every log, batch_size logs per transaction, and
+    overwrite the ones that drifted. Returns how many logs were repaired,
+    or would have been with dry_run.
+    """
+    repaired, last_id = 0, 0
+    while True:
+        # The batch is locked before it is summed, in a statement of its own:
+        # an entry write that commits first is in the snapshot of the sums
+        # taken after it, and one that commits later waits for the batch and
+        # then adjusts the repaired totals, rather than being overwritten
+        ids = select(DailyLog.id).filter(DailyLog.id > last_id).order_by(DailyLog.id).limit(batch_size)
+        ids = db.execute(ids if dry_run else ids.with_for_update()).scalars().all()
+        if not ids:
+            return repaired
+        summed = summed_totals(DailyLog.id > last_id, DailyLog.id <= ids[-1]).subquery()
+        drifted = [
+            DailyLog.id == summed.c.id,
+            func.greatest(*(func.abs(total - summed.c[name]) for name, total in TOTAL_COLUMNS.items())) > DRIFT_TOLERANCE
+        ]
+        if dry_run:
+            repaired += db.execute(select(func.count()).select_from(DailyLog).filter(*drifted)).scalar_one()
+        else:
+            stmt = (
+                update(DailyLog)
+                .where(*drifted)
+                .values({total.key: summed.c[name] for name, total in TOTAL_COLUMNS.items()})
+                .returning(DailyLog.id)
+            )
+            repaired += len(db.execute(stmt).all())
+            db.commit()
+        if len(ids) < batch_size:
+            return repaired
+        last_id = ids[-1]
@@ -1,9 +1,100 @@
+import time
+from typing import Optional
+from sqlalchemy import func, or_, select
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.cache import TTLCache, register_cache
+from backend.config import settings
 from backend.crud.base import CRUD
+from backend.database.db import execute, on_commit
 from backend.models.user import User
 from backend.schemas.user import UserCreate
-from backend.auth.security import get_password_hash
+
+# UserPrincipal snapshots keyed by username, read by get_current_user
+user_cache = TTLCache("users", settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL_SECONDS)
+
+# Unique constraints and indexes on users and the error each one is reported as
+UNIQUE_VIOLATIONS = {
+    "users_username_key": "Username already registered",
+    "users_email_key": "Email already registered",
+    "ix_users_username_lower": "Username already registered",
+    "ix_users_email_lower": "Email already registered",
+}
+
+def _unique_violation(error: ValueError) -> ValueError:
+    for constraint, message in UNIQUE_VIOLATIONS.items():
+        if constraint in str(error.__cause__):
+            return ValueError(message)
+    return error
+
+# User fields copied into access tokens; changing any of them revokes the user's tokens
+TOKEN_CLAIM_FIELDS = ("username", "email", "role", "is_active")
+
+class TokenVersions:
+    """
+    In-memory map of user id to token_version, checked by stateless auth.
+    Almost every user is still on version 0, so only the bumped rows are
+    kept and a user missing from the map is on version 0. The map is
+    reloaded in one query once it is older than TOKEN_VERSION_REFRESH_SECONDS,
+    so bumps made by other workers are picked up within that window; bumps
+    made in this process apply immediately. Users deleted by another worker
+    aren't seen, so their tokens last until they expire. Users deleted here
+    are remembered for token_lifetime, after which none of their tokens pass.
+    """
+
+    def __init__(self, refresh_seconds: float, token_lifetime: float):
+        self.refresh_seconds = refresh_seconds
+        self.token_lifetime = token_lifetime
+        self.refreshes = 0
+        self._versions: dict[int, int] = {}
+        # User id to when the last token issued before the delete expires
+        self._deleted: dict[int, float] = {}
+        self._loaded_at: Optional[float] = None
+        register_cache("token_versions", self)
+
+    async def get(self, db, user_id: int) -> Optional[int]:
+        """
+        Current token version of a user, or None if this process deleted them
+        """
+        if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_seconds:
+            await self.refresh(db)
+        if user_id in self._deleted:
+            return None
+        return self._versions.get(user_id, 0)
+
+    async def refresh(self, db):
+        stmt = select(User.id, User.token_version).filter(User.token_version > 0)
+        rows = (await execute(db, stmt)).all()
+        self._versions = {user_id: version for user_id, version in rows}
+        self._loaded_at = time.monotonic()
+        self._deleted = {user_id: until for user_id, until in self._deleted.items() if until > self._loaded_at}
+        self.refreshes += 1
+
+    def forget(self, user_id: int):
+        """
+        Mark the versions stale so the next check reads the committed rows
+        """
+        self._loaded_at = None
+
+    def discard(self, user_id: int):
+        self._deleted[user_id] = time.monotonic() + self.token_lifetime
+
+    def clear(self):
+        self._versions = {}
+        self._deleted = {}
+        self._loaded_at = None
+        self.refreshes = 0
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._versions),
+            "deleted": len(self._deleted),
+            "refresh_seconds": self.refresh_seconds,
+            "refreshes": self.refreshes
+        }
+
+token_versions = TokenVersions(settings.TOKEN_VERSION_REFRESH_SECONDS, settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
 
 class UserCRUD(CRUD):
     def __init__(self):
@@ -14,12 +105,121 @@ class UserCRUD(CRUD):
     
     def get_by_username(self, db: Session, username: str):
         return db.query(self._model).filter(self._model.username == username).first()
-    
-    @staticmethod
+
+    def _identifier_query(self, identifier: str):
+        # Either column may match, each on at most one user since both are
+        # unique regardless of case; a username match wins over an email one
+        lowered = identifier.lower()
+        return (
+            select(self._model)
+            .filter(or_(func.lower(self._model.username) == lowered, func.lower(self._model.email) == lowered))
+            .order_by((func.lower(self._model.username) == lowered).desc())
+            .limit(1)
+        )
+
+    def get_by_identifier(self, db: Session, identifier: str):
+        """
+        Case-insensitive lookup by username or email in a single query
+        """
+        return db.execute(self._identifier_query(identifier)).scalars().first()
+
+    async def aget_by_identifier(self, db, identifier: str):
+        if not isinstance(db, AsyncSession):
+            return self.get_by_identifier(db, identifier)
+        return (await db.execute(self._identifier_query(identifier))).scalars().first()
+
+    # Inserts go first and let the unique constraints catch duplicates, which
+    # saves the existence checks a round trip each
+    def create(self, db: Session, schema):
+        try:
+            return super().create(db, schema)
+        except ValueError as e:
+            raise _unique_violation(e) from e.__cause__
+
+    async def acreate(self, db, schema):
+        try:
+            return await super().acreate(db, schema)
+        except ValueError as e:
+            raise _unique_violation(e) from e.__cause__
+
+    async def aget_by_email(self, db, email: str):
+        if not isinstance(db, AsyncSession):
+            return self.get_by_email(db, email)
+        stmt = select(self._model).filter(self._model.email == email).limit(1)
+        return (await db.execute(stmt)).scalars().first()
+
+    async def aget_by_username(self, db, username: str):
+        if not isinstance(db, AsyncSession):
+            return self.get_by_username(db, username)
+        stmt = select(self._model).filter(self._model.username == username).limit(1)
+        return (await db.execute(stmt)).scalars().first()
+
+    def _bump_token_version(self, db_obj, schema) -> dict:
+        obj_data = self._dump(schema, exclude_unset=True)
+        if any(field in obj_data and obj_data[field] != getattr(db_obj, field) for field in TOKEN_CLAIM_FIELDS):
+            # Incremented in SQL so concurrent bumps can't collapse into one
+            obj_data["token_version"] = self._model.token_version + 1
+        return obj_data
+
+    # Writes drop the cached principal before and again once committed, so a
+    # rename or a concurrent read of the old row can't leave a stale entry
+    # behind. A bumped token_version is an SQL expression, so rather than
+    # reading it back the cached version is forgotten and reloaded on use.
+    def _invalidate(self, db, user_id: int, usernames: tuple, bumped: bool):
+        def invalidate():
+            for username in usernames:
+                user_cache.pop(username)
+            if bumped:
+                token_versions.forget(user_id)
+        on_commit(db, invalidate)
+
+    def _discard(self, db, user_id: int, username: str):
+        def discard():
+            user_cache.pop(username)
+            token_versions.discard(user_id)
+        on_commit(db, discard)
+
+    def update(self, db: Session, db_obj, schema):
+        username = db_obj.username
+        user_cache.pop(username)
+        obj_data = self._bump_token_version(db_obj, schema)
+        try:
+            db_obj = super().update(db, db_obj, obj_data)
+        except ValueError as e:
+            raise _unique_violation(e) from e.__cause__
+        self._invalidate(db, db_obj.id, (username, db_obj.username), "token_version" in obj_data)
+        return db_obj
+
+    async def aupdate(self, db, db_obj, schema):
+        username = db_obj.username
+        user_cache.pop(username)
+        obj_data = self._bump_token_version(db_obj, schema)
+        try:
+            db_obj = await super().aupdate(db, db_obj, obj_data)
+        except ValueError as e:
+            raise _unique_violation(e) from e.__cause__
+        self._invalidate(db, db_obj.id, (username, db_obj.username), "token_version" in obj_data)
+        return db_obj
+
+    def delete(self, db: Session, db_obj):
+        user_id, username = db_obj.id, db_obj.username
+        user_cache.pop(username)
+        db_obj = super().delete(db, db_obj)
+        self._discard(db, user_id, username)
+        return db_obj
+
+    async def adelete(self, db, db_obj):
+        user_id, username = db_obj.id, db_obj.username
+        user_cache.pop(username)
+        db_obj = await super().adelete(db, db_obj)
+        self._discard(db, user_id, username)
+        return db_obj
+
     def deactivate_user(self, db: Session, user: User):
-        user.is_active = False
-        db.add(user)
-        db.commit()
-        return user
-    
+        """
+        Deactivate a user through update, which drops their cached principal
+        and bumps their token_version
+        """
+        return self.update(db, user, {"is_active": False})
+
 user_crud = UserCRUD()
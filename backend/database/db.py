@@ -1,8 +1,16 @@
-from typing import Generator
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import inspect
+from typing import AsyncGenerator, Generator
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session as OrmSession, sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import NullPool
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from backend.config import settings
+from backend.database.pool import MeteredAsyncQueuePool, MeteredQueuePool, PoolMetrics
+from backend.database.queries import instrument
+from backend.database.routing import RoutingSession
 
 class Base(DeclarativeBase):
     pass
@@ -15,17 +23,136 @@ url = (
     f"{settings.POSTGRES_DB}"
 )
 
-engine = create_engine(url)
-Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def to_async_url(sync_url: str) -> str:
+    return sync_url.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+async_url = to_async_url(url)
+
+def engine_options(is_async: bool = False) -> dict:
+    """
+    Pool arguments for create_engine/create_async_engine from settings
+    """
+    if settings.DATABASE_NULL_POOL:
+        options = {"poolclass": NullPool}
+        if is_async:
+            # PgBouncer hands each transaction to any server connection, so
+            # asyncpg's named prepared statements can't be reused
+            options["connect_args"] = {"statement_cache_size": 0, "prepared_statement_cache_size": 0}
+        return options
+    return {
+        "poolclass": MeteredAsyncQueuePool if is_async else MeteredQueuePool,
+        "pool_size": settings.DATABASE_POOL_SIZE,
+        "max_overflow": settings.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": settings.DATABASE_POOL_TIMEOUT,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+        "pool_pre_ping": settings.DATABASE_POOL_PRE_PING,
+    }
+
+# Statements are counted per request on every engine, replicas and the
+# sync side of async engines included
+instrument(Engine)
+
+engine = create_engine(url, **engine_options())
+PoolMetrics("primary", engine)
+
+# Replica transactions are opened READ ONLY so a stray write fails loudly
+replica_engines = [
+    create_engine(replica_url, **engine_options()).execution_options(postgresql_readonly=True)
+    for replica_url in settings.DATABASE_REPLICA_URLS
+]
+for i, replica_engine in enumerate(replica_engines):
+    PoolMetrics(f"replica_{i}", replica_engine)
+
+# Objects stay loaded after commit, so nothing is re-selected to serialize them
+Session = sessionmaker(
+    class_=RoutingSession, autocommit=False, autoflush=False, expire_on_commit=False,
+    primary=engine, replicas=replica_engines
+)
+
+# Only built in async mode so asyncpg stays an optional dependency
+async_engine = None
+async_replica_engines = []
+if settings.DATABASE_ASYNC:
+    async_engine = create_async_engine(async_url, **engine_options(is_async=True))
+    PoolMetrics("primary_async", async_engine.sync_engine)
+    for i, replica_url in enumerate(settings.DATABASE_REPLICA_URLS):
+        replica_engine = create_async_engine(to_async_url(replica_url), **engine_options(is_async=True))
+        async_replica_engines.append(replica_engine.execution_options(postgresql_readonly=True))
+        PoolMetrics(f"replica_{i}_async", replica_engine.sync_engine)
+
+async_session = async_sessionmaker(
+    sync_session_class=RoutingSession, autoflush=False, expire_on_commit=False,
+    primary=async_engine.sync_engine if async_engine is not None else None,
+    replicas=[replica.sync_engine for replica in async_replica_engines]
+)
 
 def create_tables():
     Base.metadata.create_all(engine)
 
-def get_db() -> Generator:
+def _read_only(request: Request) -> bool:
+    return request.method in ("GET", "HEAD")
+
+# In unit of work mode CRUD writes only flush, and get_db commits the
+# request's transaction once the route returns. A route that raises leaves
+# it uncommitted, so closing the session rolls all of its writes back.
+
+def in_unit_of_work(db) -> bool:
+    return db.info.get("unit_of_work", False)
+
+def on_commit(db, callback):
+    """
+    Run callback once the session's writes are committed: right away when
+    CRUD commits per call, at the end of the request in unit of work mode
+    """
+    if in_unit_of_work(db):
+        db.info.setdefault("on_commit", []).append(callback)
+    else:
+        callback()
+
+@event.listens_for(OrmSession, "after_commit")
+def _run_on_commit(session):
+    for callback in session.info.pop("on_commit", ()):
+        callback()
+
+@event.listens_for(OrmSession, "after_transaction_end")
+def _drop_on_commit(session, transaction):
+    # Runs after after_commit; whatever is left was rolled back. Savepoints
+    # ending don't end the request's transaction.
+    if transaction.parent is None:
+        session.info.pop("on_commit", None)
+
+def get_sync_db(request: Request) -> Generator:
     db = Session()
+    db.info["read_only"] = _read_only(request)
+    db.info["unit_of_work"] = settings.DATABASE_UNIT_OF_WORK
     try:
         yield db
+        if in_unit_of_work(db):
+            db.commit()
     finally:
         db.close()
 
-    
\ No newline at end of file
+async def get_async_db(request: Request) -> AsyncGenerator:
+    async with async_session() as db:
+        db.info["read_only"] = _read_only(request)
+        db.info["unit_of_work"] = settings.DATABASE_UNIT_OF_WORK
+        yield db
+        if in_unit_of_work(db):
+            await db.commit()
+
+# Routes depend on get_db, so the engine mode is picked once from settings
+get_db = get_async_db if settings.DATABASE_ASYNC else get_sync_db
+
+async def resolve(value):
+    """
+    Await the result of a session call when it came from an AsyncSession
+    """
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+async def execute(db, statement):
+    """
+    Execute a statement on either a sync Session or an AsyncSession
+    """
+    return await resolve(db.execute(statement))
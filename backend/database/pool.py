@@ -0,0 +1,117 @@
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+_pools: dict[str, "PoolMetrics"] = {}
+
+class PoolMetrics:
+    """
+    Connection pool counters fed by pool events, plus the time callers spent
+    waiting for a connection to come free
+    """
+    def __init__(self, name: str, engine: Engine):
+        self.name = name
+        self.engine = engine
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+        # Listening on the engine keeps the listeners across engine.dispose()
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+        engine.pool._metrics = self
+        _pools[name] = self
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def observe_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.waits += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def stats(self) -> dict:
+        pool = self.engine.pool
+        with self._lock:
+            checked_out = self.checkouts - self.checkins
+            stats = {
+                "pool_class": type(pool).__name__,
+                "checked_out": checked_out,
+                "idle": 0,
+                "overflow": 0,
+                "size": None,
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.wait_seconds / self.waits * 1000, 3) if self.waits else None,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 3)
+            }
+        if isinstance(pool, QueuePool):
+            stats.update(
+                checked_out=pool.checkedout(),
+                idle=pool.checkedin(),
+                # overflow() counts up from -pool_size until the pool is full
+                overflow=max(pool.overflow(), 0),
+                size=pool.size()
+            )
+        return stats
+
+class _TimedGetMixin:
+    # A pool event only fires once a connection is handed out, so the wait
+    # for a free slot is timed around the pool's own get
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self._observe_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        self._observe_wait(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool._metrics = getattr(self, "_metrics", None)
+        return pool
+
+    def _observe_wait(self, seconds: float, timed_out: bool = False):
+        metrics = getattr(self, "_metrics", None)
+        if metrics is not None:
+            metrics.observe_wait(seconds, timed_out)
+
+class MeteredQueuePool(_TimedGetMixin, QueuePool):
+    pass
+
+class MeteredAsyncQueuePool(_TimedGetMixin, AsyncAdaptedQueuePool):
+    pass
+
+def pool_stats() -> dict:
+    return {name: metrics.stats() for name, metrics in _pools.items()}
@@ -0,0 +1,61 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+from sqlalchemy import event
+
+# Every QueryStats open in the current context; a request's middleware and a
+# test's track_queries() block can both be collecting at once
+_active: ContextVar[tuple["QueryStats", ...]] = ContextVar("query_stats", default=())
+
+class QueryStats:
+    """
+    Statements executed while tracking was on and the time spent running them.
+    Identical statement strings are counted together, so a statement run once
+    per row of an earlier result shows up in repeated().
+    """
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter[str] = Counter()
+
+    @property
+    def milliseconds(self) -> float:
+        return round(self.seconds * 1000, 3)
+
+    def repeated(self, threshold: int) -> dict[str, int]:
+        return {statement: n for statement, n in self.statements.items() if n >= threshold}
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    stats = QueryStats()
+    token = _active.set(_active.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _active.reset(token)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    active = _active.get()
+    if not active:
+        return
+    for stats in active:
+        stats.count += 1
+        stats.statements[statement] += 1
+    conn.info["query_started"] = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    for stats in _active.get():
+        stats.seconds += elapsed
+
+def instrument(target):
+    """
+    Count statements run on target, an Engine or the Engine class for all of them
+    """
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
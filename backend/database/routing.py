@@ -0,0 +1,56 @@
+import random
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from backend.cache import TTLCache
+from backend.config import settings
+
+# Users who committed a write recently; their reads stay on the primary until
+# replication has had time to catch up. Only requests served by this process
+# see the entry, other workers may still send the user's reads to a replica.
+recent_writers = TTLCache("recent_writers", settings.USER_CACHE_SIZE, settings.REPLICA_STICKY_SECONDS)
+
+class RoutingSession(Session):
+    """
+    Session that sends read-only requests to a replica and everything else to
+    the primary. A request is read-only when get_db marks it so (GET routes);
+    flushes always go to the primary, as do reads for users in recent_writers.
+    A user is added there when their request commits a flush or a Core
+    INSERT, UPDATE or DELETE.
+    session.info["user_id"] is set by the auth dependencies.
+    """
+    def __init__(self, *args, primary: Engine, replicas: list[Engine] = (), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.primary = primary
+        # One replica per session, so a request reads from a single snapshot
+        self.replica = random.choice(replicas) if replicas else None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.replica is not None and self.info.get("read_only") and not self._flushing:
+            user_id = self.info.get("user_id")
+            if user_id is None or recent_writers.get(user_id) is None:
+                return self.replica
+        return self.primary
+
+def mark_write(session):
+    """
+    Record that the session wrote, for writes the hooks below can't see,
+    such as an INSERT inside a SELECT's CTE
+    """
+    session.info["wrote"] = True
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_write(session, flush_context):
+    mark_write(session)
+
+# Core INSERT, UPDATE and DELETE statements (bulk writes) never flush
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _mark_statement_write(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        mark_write(orm_execute_state.session)
+
+@event.listens_for(RoutingSession, "after_commit")
+def _stick_writer(session):
+    if session.info.pop("wrote", False) and session.info.get("user_id") is not None:
+        recent_writers.set(session.info["user_id"], True)
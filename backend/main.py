@@ -1,8 +1,12 @@
-from fastapi import FastAPI
+import logging
+from fastapi import FastAPI, Request
 from backend.api import router as api_router
 from backend.database.db import Base, engine
+from backend.database.queries import track_queries
 from backend.config import settings
 
+logger = logging.getLogger("backend.queries")
+
 Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
@@ -13,6 +17,31 @@ app = FastAPI(
 
 app.include_router(api_router)
 
+@app.middleware("http")
+async def count_queries(request: Request, call_next):
+    with track_queries() as queries:
+        response = await call_next(request)
+
+    response.headers["X-DB-Query-Count"] = str(queries.count)
+    response.headers["X-DB-Query-Time-Ms"] = str(queries.milliseconds)
+    fields = {
+        "method": request.method,
+        "path": request.url.path,
+        "status": response.status_code,
+        "queries": queries.count,
+        "db_ms": queries.milliseconds
+    }
+    logger.info(" ".join(f"{key}={value}" for key, value in fields.items()), extra=fields)
+
+    repeated = queries.repeated(settings.QUERY_REPEAT_WARNING)
+    if repeated:
+        logger.warning(
+            f"Possible N+1 on {request.method} {request.url.path}: "
+            + "; ".join(f"{n}x {' '.join(statement.split())[:120]}" for statement, n in repeated.items()),
+            extra={**fields, "repeated": repeated}
+        )
+    return response
+
 @app.get("/")
 async def root():
     return {
@@ -2,5 +2,6 @@ from backend.models.daily_log import DailyLog
 from backend.models.food_entry import FoodEntry
 from backend.models.food import Food
 from backend.models.user import User
+from backend.models.revoked_token import RevokedToken
 from backend.database.db import Base
 
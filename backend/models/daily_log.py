@@ -11,6 +11,9 @@ if TYPE_CHECKING:
     from .user import User
     from .food_entry import FoodEntry
 
+# Food values summed into a log's totals, each weighted by the entry's quantity
+NUTRIENTS = ("calories", "protein", "carbs", "fat")
+
 class DailyLog(Base):
     __tablename__ = 'daily_logs'
 
@@ -18,9 +21,21 @@ class DailyLog(Base):
     date: Mapped[datetime.date] = mapped_column(Date, nullable=False, default=datetime.date.today)
     user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False)
 
+    # Running sums over the entries, adjusted by backend.crud.totals on every
+    # entry and food change
+    total_calories: Mapped[float] = mapped_column(nullable=False, default=0, server_default="0")
+    total_protein: Mapped[float] = mapped_column(nullable=False, default=0, server_default="0")
+    total_carbs: Mapped[float] = mapped_column(nullable=False, default=0, server_default="0")
+    total_fat: Mapped[float] = mapped_column(nullable=False, default=0, server_default="0")
+
     user: Mapped[User] = relationship(back_populates="logs")
     food_entries: Mapped[List[FoodEntry]] = relationship(back_populates="daily_log", cascade="all, delete-orphan")
 
+    @property
+    def totals(self) -> dict[str, float]:
+        return {name: getattr(self, f"total_{name}") for name in NUTRIENTS}
+
+    # Also the (user_id, date) index behind per-user date range queries
     __table_args__ = (UniqueConstraint('user_id', 'date', name='_user_date_uc'),)
 
     
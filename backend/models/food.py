@@ -11,10 +11,11 @@ class Food(Base):
     manufacturer: Mapped[str] = mapped_column(nullable=False)
     serving_size: Mapped[float] = mapped_column(nullable=False)
     unit: Mapped[str] = mapped_column(nullable=False)
-    calories: Mapped[float] = mapped_column(nullable=False)
-    protein: Mapped[float] = mapped_column(nullable=False)
-    carbs: Mapped[float] = mapped_column(nullable=False)
-    fat: Mapped[float] = mapped_column(nullable=False)
+    # Old values are kept on change so log totals can be moved by the difference
+    calories: Mapped[float] = mapped_column(nullable=False, active_history=True)
+    protein: Mapped[float] = mapped_column(nullable=False, active_history=True)
+    carbs: Mapped[float] = mapped_column(nullable=False, active_history=True)
+    fat: Mapped[float] = mapped_column(nullable=False, active_history=True)
 
     __table_args__ = (
             UniqueConstraint('name', 'manufacturer', name='uq_name_manufacturer'),
@@ -13,9 +13,11 @@ class FoodEntry(Base):
     __tablename__ = 'food_entries'
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    daily_log_id: Mapped[int] = mapped_column(ForeignKey('daily_logs.id'), nullable=False)
-    food_id: Mapped[int] = mapped_column(ForeignKey('foods.id'), nullable=False)
-    quantity: Mapped[float] = mapped_column(nullable=False, default=1.0)
+    # Postgres doesn't index foreign keys; entries are always reached through their log
+    # Old values are kept on change so the log's totals can take the old entry out
+    daily_log_id: Mapped[int] = mapped_column(ForeignKey('daily_logs.id'), nullable=False, index=True, active_history=True)
+    food_id: Mapped[int] = mapped_column(ForeignKey('foods.id'), nullable=False, active_history=True)
+    quantity: Mapped[float] = mapped_column(nullable=False, default=1.0, active_history=True)
 
     daily_log: Mapped[DailyLog] = relationship(back_populates="food_entries")
     food: Mapped[Food] = relationship()
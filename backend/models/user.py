@@ -1,7 +1,7 @@
 from __future__ import annotations
 from typing import List, TYPE_CHECKING
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import Boolean
+from sqlalchemy import Boolean, Index, UniqueConstraint, func
 
 from backend.database.db import Base
 
@@ -12,12 +12,23 @@ class User(Base):
     __tablename__ = 'users'
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    username: Mapped[str] = mapped_column(unique=True, nullable=False)
-    email: Mapped[str] = mapped_column(unique=True, nullable=False)
+    username: Mapped[str] = mapped_column(nullable=False)
+    email: Mapped[str] = mapped_column(nullable=False)
     hashed_password: Mapped[str] = mapped_column(nullable=False)  
     is_active: Mapped[bool] = mapped_column(Boolean, default=True) 
     role: Mapped[str] = mapped_column(nullable=False, default="user")
+    # Bumped whenever a claim embedded in issued tokens changes, revoking them
+    token_version: Mapped[int] = mapped_column(nullable=False, default=0, server_default="0")
 
     logs: Mapped[List[DailyLog]] = relationship(back_populates="user", cascade="all, delete-orphan")
 
+    # Named like Postgres' defaults for unique=True, so existing tables match
+    __table_args__ = (
+        UniqueConstraint('username', name='users_username_key'),
+        UniqueConstraint('email', name='users_email_key'),
+    )
 
+# Usernames and emails are unique regardless of case, which also serves the
+# case-insensitive lookups in UserCRUD.get_by_identifier
+Index('ix_users_username_lower', func.lower(User.username), unique=True)
+Index('ix_users_email_lower', func.lower(User.email), unique=True)
@@ -0,0 +1,13 @@
+import argparse
+from backend.crud.totals import reconcile
+from backend.database.db import Session
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute daily log totals from their entries and repair drift")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Logs recomputed per transaction")
+    parser.add_argument("--dry-run", action="store_true", help="Count drifted logs without repairing them")
+    args = parser.parse_args()
+
+    with Session() as db:
+        repaired = reconcile(db, batch_size=args.batch_size, dry_run=args.dry_run)
+    print(f"{repaired} log(s) {'drifted' if args.dry_run else 'repaired'}")
@@ -1,4 +1,12 @@
-from .daily_log import DailyLogBase, DailyLogCreate, DailyLogResponse
-from .user import UserBase, UserCreate, UserResponse
+from .daily_log import DailyLogBase, DailyLogCreate, DailyLogResponse, DailyLogExpandedResponse, DailyLogEntriesResponse, NutritionTotals, SummaryBucket, LogSummaryResponse, LogTrendsResponse
+from .user import UserBase, UserCreate, UserResponse, UserExpandedResponse, UserPrincipal
 from .food_entry import FoodEntryBase, FoodEntryCreate, FoodEntryResponse
-from .food import FoodBase, FoodCreate, FoodResponse
\ No newline at end of file
+from .food import FoodBase, FoodCreate, FoodResponse, FoodBulkUpdate
+from .bulk import BulkError, BulkResponse
+from .pagination import Page
+
+# The expanded schemas refer to each other's modules, so resolve them once all are imported
+UserExpandedResponse.model_rebuild()
+DailyLogExpandedResponse.model_rebuild()
+DailyLogEntriesResponse.model_rebuild()
+FoodEntryResponse.model_rebuild()
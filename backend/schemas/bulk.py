@@ -0,0 +1,12 @@
+from pydantic import BaseModel
+from typing import Generic, List, TypeVar
+
+T = TypeVar("T")
+
+class BulkError(BaseModel):
+    index: int
+    error: str
+
+class BulkResponse(BaseModel, Generic[T]):
+    items: List[T]
+    errors: List[BulkError]
@@ -1,22 +1,67 @@
 from __future__ import annotations
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, TYPE_CHECKING, Optional
-from datetime import date
+from typing import Dict, List, TYPE_CHECKING, Optional
+import datetime
 
 if TYPE_CHECKING:
     from .user import UserResponse
     from .food_entry import FoodEntryResponse
 
+# datetime.date rather than date, a field named date would shadow the type
 class DailyLogBase(BaseModel):
     user_id: int = Field(gt=0)
-    date: Optional[date] = None
+    date: Optional[datetime.date] = None
     
 class DailyLogCreate(BaseModel):  # Don't inherit from Base for create
-    date: Optional[date] = None  # User shouldn't send user_id
+    date: Optional[datetime.date] = None  # User shouldn't send user_id
     
 class DailyLogResponse(DailyLogBase):
     id: int = Field(gt=0)
-    user: UserResponse
-    food_entries: List[FoodEntryResponse] = []
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+class NutritionTotals(BaseModel):
+    # Sum of quantity * the food's value over the log's entries
+    calories: float = 0
+    protein: float = 0
+    carbs: float = 0
+    fat: float = 0
+
+class SummaryBucket(BaseModel):
+    start: datetime.date
+    days_logged: int
+    totals: NutritionTotals
+    # Per day that has a log
+    averages: NutritionTotals
+
+class LogSummaryResponse(BaseModel):
+    start: datetime.date = Field(serialization_alias="from")
+    end: datetime.date = Field(serialization_alias="to")
+    bucket: str
+    buckets: List[SummaryBucket]
+
+# A series has a value per date, None on days without a log or that one
+# can't be computed for
+Series = List[Optional[float]]
+
+class LogTrendsResponse(BaseModel):
+    start: datetime.date = Field(serialization_alias="from")
+    end: datetime.date = Field(serialization_alias="to")
+    dates: List[datetime.date]
+    totals: Dict[str, Series]
+    # Keyed by window in days, then nutrient; averaged over the days logged
+    moving_averages: Dict[str, Dict[str, Series]]
+    deltas: Dict[str, Series]
+    # Percent of the calories from protein, carbs and fat
+    macro_percentages: Dict[str, Series]
+
+class DailyLogExpandedResponse(DailyLogResponse):
+    # Relations are only present when asked for with ?expand=
+    user: Optional[UserResponse] = None
+    food_entries: Optional[List[FoodEntryResponse]] = None
+    totals: Optional[NutritionTotals] = None
+
+class DailyLogEntriesResponse(DailyLogResponse):
+    # Log looked up by date, always with its entries, their foods and the totals
+    food_entries: List[FoodEntryResponse]
+    totals: NutritionTotals
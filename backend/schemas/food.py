@@ -27,4 +27,15 @@ class FoodUpdate(BaseModel):
     calories: Optional[float] = Field(ge=0, default=0)
     protein: Optional[float] = Field(ge=0, default=0)
     carbs: Optional[float] = Field(ge=0, default=0)
-    fat: Optional[float] = Field(ge=0, default=0)
\ No newline at end of file
+    fat: Optional[float] = Field(ge=0, default=0)
+
+class FoodBulkUpdate(BaseModel):
+    id: int = Field(gt=0)
+    name: Optional[str] = Field(None, min_length=1)
+    manufacturer: Optional[str] = Field(None, min_length=1)
+    serving_size: Optional[float] = Field(None, gt=0)
+    unit: Optional[str] = Field(None, min_length=1)
+    calories: Optional[float] = Field(None, ge=0)
+    protein: Optional[float] = Field(None, ge=0)
+    carbs: Optional[float] = Field(None, ge=0)
+    fat: Optional[float] = Field(None, ge=0)
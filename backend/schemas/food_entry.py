@@ -28,4 +28,5 @@ class FoodEntryResponse(BaseModel):
 
 
 class FoodEntryUpdate(BaseModel):
+    food_id: Optional[int] = Field(default=None, gt=0)
     quantity: Optional[float] = Field(gt=0)
\ No newline at end of file
@@ -15,12 +15,26 @@ class UserCreate(UserBase):
 
 class UserResponse(UserBase):
     id: int = Field(gt=0)
-    logs: List[DailyLogResponse] = []
     is_active: bool = True 
     role: str 
 
     model_config = ConfigDict(from_attributes=True)
 
+class UserExpandedResponse(UserResponse):
+    # Relations are only present when asked for with ?expand=
+    logs: Optional[List[DailyLogResponse]] = None
+
+class UserPrincipal(BaseModel):
+    # Immutable snapshot of what authorization needs, cached across requests
+    id: int
+    username: str
+    email: str
+    role: str
+    is_active: bool
+    token_version: int = 0
+
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
 class UserUpdate(BaseModel):
     username: Optional[str] = Field(min_length=1)
     email: Optional[EmailStr]
@@ -0,0 +1,55 @@
+import pytest
+from contextlib import contextmanager
+
+from backend.cache import clear_caches
+from backend.config import settings
+from backend.database.queries import track_queries
+
+
+def pytest_addoption(parser):
+    parser.addoption("--benchmark", action="store_true", help="also run the timing benchmarks")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: timing comparison, skipped unless --benchmark is given")
+
+
+def pytest_collection_modifyitems(config, items):
+    """Timings depend on the machine, so benchmarks only run when asked for"""
+    if config.getoption("--benchmark"):
+        return
+    skip = pytest.mark.skip(reason="benchmark, run with --benchmark -s")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture(autouse=True)
+def reset_caches():
+    """In-process caches outlive the per-test database, so empty them around every test"""
+    clear_caches()
+    yield
+    clear_caches()
+
+
+@pytest.fixture(autouse=True)
+def raiseload(monkeypatch):
+    """Routes declare what they load, so any lazy load they didn't ask for fails the test"""
+    monkeypatch.setattr(settings, "DATABASE_RAISELOAD", True)
+
+
+@pytest.fixture
+def max_queries():
+    """
+    Fail when the block runs more statements than allowed, e.g.
+    with max_queries(3): client.get("/api/v1/logs/")
+    """
+    @contextmanager
+    def check(limit: int):
+        with track_queries() as queries:
+            yield queries
+        assert queries.count <= limit, (
+            f"{queries.count} queries, expected at most {limit}:\n"
+            + "\n".join(f"{n}x {statement}" for statement, n in queries.statements.items())
+        )
+    return check
@@ -6,7 +6,8 @@ from datetime import date
 from backend.main import app
 from backend.models import User, DailyLog, Food, FoodEntry
 from backend.auth.security import get_password_hash, create_access_token
-from backend.database.db import get_db
+from backend.config import settings
+from backend.database.db import get_db, in_unit_of_work
 
 # Import test database setup from integration tests
 from tests.integration.test_auth_integration import (
@@ -19,10 +20,14 @@ def client(db_session):
     """Return a FastAPI TestClient configured to use the test database"""
     
     def override_get_db():
+        # Mirrors get_db: writes are committed once the route returns
+        db_session.info["unit_of_work"] = settings.DATABASE_UNIT_OF_WORK
         try:
             yield db_session
+            if in_unit_of_work(db_session):
+                db_session.commit()
         finally:
-            pass
+            db_session.info.pop("unit_of_work", None)
     
     # Fix: Use the actual function, not a string
     app.dependency_overrides[get_db] = override_get_db
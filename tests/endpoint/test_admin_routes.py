@@ -1,8 +1,10 @@
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from datetime import date
+from datetime import date, timedelta
 
+from backend.cache import clear_caches
 from backend.main import app
 from backend.models import User, DailyLog, Food, FoodEntry
 
@@ -28,6 +30,43 @@ def test_get_stats_admin(admin_client: TestClient, test_user, test_admin,
     assert stats["total_food_entries"] >= 2
 
 
+def test_get_stats_cached(admin_client: TestClient, test_admin, db_session: Session, max_queries):
+    """Test that stats are counted in one statement and then served from cache"""
+    # Revocation refresh, admin lookup, stats
+    with max_queries(3):
+        first = admin_client.get("/api/v1/admin/stats").json()
+    assert all(first["exact"].values())
+
+    db_session.add(User(username="late", email="late@example.com", hashed_password="x"))
+    db_session.commit()
+
+    second = admin_client.get("/api/v1/admin/stats").json()
+    assert second["system_stats"] == first["system_stats"]
+    assert second["age_seconds"] >= first["age_seconds"]
+
+
+def test_get_stats_approximate(admin_client: TestClient, test_admin, test_foods, test_daily_log,
+                               test_food_entries, db_session: Session):
+    """Test that approximate mode reads analyzed tables from pg_class"""
+    # Fresh tables have no statistics yet and are counted exactly
+    data = admin_client.get("/api/v1/admin/stats?approximate=true").json()
+    assert data["system_stats"]["total_food_entries"] == 2
+    assert all(data["exact"].values())
+
+    clear_caches()
+    for table in ("foods", "daily_logs", "food_entries"):
+        db_session.execute(text(f"ANALYZE {table}"))
+
+    response = admin_client.get("/api/v1/admin/stats?approximate=true")
+    assert response.status_code == 200
+
+    data = response.json()
+    stats = data["system_stats"]
+    assert (stats["total_foods"], stats["total_daily_logs"], stats["total_food_entries"]) == (3, 1, 2)
+    assert data["exact"]["total_users"] is True
+    assert data["exact"]["total_food_entries"] is False
+
+
 def test_get_stats_non_admin(authorized_client: TestClient):
     """Test getting system stats as non-admin user"""
     response = authorized_client.get("/api/v1/admin/stats")
@@ -64,8 +103,91 @@ def test_get_user_activity_custom_days(admin_client: TestClient):
     assert "users" in data
 
 
+@pytest.fixture
+def active_users(db_session: Session, test_foods):
+    """Users with 1-3 logs this week, each log holding as many entries as the user's number"""
+    users = []
+    for n in range(1, 4):
+        user = User(username=f"active{n}", email=f"active{n}@example.com", hashed_password="x")
+        db_session.add(user)
+        db_session.flush()
+        for day in range(n):
+            log = DailyLog(user_id=user.id, date=date.today() - timedelta(days=day))
+            db_session.add(log)
+            db_session.flush()
+            db_session.add_all(FoodEntry(daily_log_id=log.id, food_id=test_foods[0].id) for _ in range(n))
+        users.append(user)
+    # Only logs inside the period count
+    db_session.add(DailyLog(user_id=users[0].id, date=date.today() - timedelta(days=30)))
+    inactive = User(username="inactive", email="inactive@example.com", hashed_password="x", is_active=False)
+    db_session.add(inactive)
+    db_session.flush()
+    db_session.add(DailyLog(user_id=inactive.id, date=date.today()))
+    db_session.commit()
+    return users
+
+
+def test_get_user_activity_counts(admin_client: TestClient, active_users):
+    """Test that activity is aggregated per active user and ordered by activity"""
+    response = admin_client.get("/api/v1/admin/users-activity")
+    assert response.status_code == 200
+
+    data = response.json()
+    assert data["total_active_users"] == 3
+    assert data["next_cursor"] is None
+    counts = [(user["username"], user["logs_count"], user["entries_count"]) for user in data["users"]]
+    assert counts == [("active3", 3, 9), ("active2", 2, 4), ("active1", 1, 1)]
+
+
+@pytest.mark.parametrize("order,expected", [
+    ("activity", ["active3", "active2", "active1"]),
+    ("user_id", ["active1", "active2", "active3"])
+])
+def test_get_user_activity_keyset_pages(admin_client: TestClient, active_users, order, expected):
+    """Test walking the activity report two users at a time"""
+    response = admin_client.get(f"/api/v1/admin/users-activity?limit=2&order={order}")
+    first = response.json()
+    assert first["next_cursor"] is not None
+
+    response = admin_client.get(f"/api/v1/admin/users-activity?limit=2&order={order}&cursor={first['next_cursor']}")
+    second = response.json()
+    assert second["next_cursor"] is None
+    assert [user["username"] for user in first["users"] + second["users"]] == expected
+
+
+def test_get_user_activity_invalid_cursor(admin_client: TestClient):
+    """Test that a malformed cursor is rejected"""
+    response = admin_client.get("/api/v1/admin/users-activity?cursor=not-a-cursor")
+    assert response.status_code == 400
+
+
+def test_get_user_activity_query_count(admin_client: TestClient, active_users, max_queries):
+    """Test that the activity report runs one query however many users are active"""
+    # Revocation refresh, admin lookup, activity
+    with max_queries(3):
+        response = admin_client.get("/api/v1/admin/users-activity")
+    assert response.status_code == 200
+    assert response.headers["X-DB-Query-Count"] == "3"
+
+
 def test_get_user_activity_non_admin(authorized_client: TestClient):
     """Test getting user activity as non-admin user"""
     response = authorized_client.get("/api/v1/admin/users-activity")
     assert response.status_code == 403
     assert "Insufficient permissions" in response.json()["detail"]
+
+
+def test_get_db_pool_stats_admin(admin_client: TestClient):
+    """Test that connection pool stats are exposed to admins"""
+    response = admin_client.get("/api/v1/admin/db-pool")
+    assert response.status_code == 200
+
+    primary = response.json()["pools"]["primary"]
+    for key in ("checked_out", "idle", "overflow", "avg_wait_ms", "max_wait_ms", "timeouts"):
+        assert key in primary
+
+
+def test_get_db_pool_stats_non_admin(authorized_client: TestClient):
+    """Test that pool stats are admin only"""
+    response = authorized_client.get("/api/v1/admin/db-pool")
+    assert response.status_code == 403
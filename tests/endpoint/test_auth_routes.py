@@ -6,7 +6,7 @@ from jose import jwt
 from backend.main import app
 from backend.config import settings
 from backend.models import User
-from backend.auth.security import get_password_hash
+from backend.auth.security import get_password_hash, create_access_token
 
 
 @pytest.fixture
@@ -169,3 +169,16 @@ def test_logout(client: TestClient, user_token):
     response = client.post("/api/v1/auth/logout")
     assert response.status_code == 200
     assert "Successfully logged out" in response.json()["detail"]
+
+
+def test_logout_revokes_token(client: TestClient, test_user, user_token):
+    """Test that a token can't be used after logging out with it"""
+    other_token = create_access_token(data={"sub": test_user.username})
+    client.headers = {"Authorization": f"Bearer {user_token}"}
+    assert client.get("/api/v1/logs/").status_code == 200
+
+    assert client.post("/api/v1/auth/logout").status_code == 200
+
+    assert client.get("/api/v1/logs/").status_code == 401
+    client.headers = {"Authorization": f"Bearer {other_token}"}
+    assert client.get("/api/v1/logs/").status_code == 200
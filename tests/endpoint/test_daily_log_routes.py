@@ -4,7 +4,7 @@ from sqlalchemy.orm import Session
 from datetime import date, timedelta
 
 from backend.main import app
-from backend.models import DailyLog
+from backend.models import DailyLog, FoodEntry, User
 
 
 def test_create_daily_log(authorized_client: TestClient, test_user, db_session: Session):
@@ -62,6 +62,82 @@ def test_create_daily_log_unauthorized(client: TestClient):
     assert "Not authenticated" in response.json()["detail"]
 
 
+def test_put_daily_log_by_date(authorized_client: TestClient, test_user, db_session: Session, max_queries):
+    """Test that putting a log by date creates it once and then returns the same log"""
+    log_date = (date.today() - timedelta(days=3)).isoformat()
+
+    # Revocation refresh, user lookup, upsert
+    with max_queries(3):
+        response = authorized_client.put(f"/api/v1/logs/by-date/{log_date}")
+    assert response.status_code == 201
+    created = response.json()
+    assert created["date"] == log_date
+    assert created["user_id"] == test_user.id
+
+    response = authorized_client.put(f"/api/v1/logs/by-date/{log_date}")
+    assert response.status_code == 200
+    assert response.json() == created
+    assert db_session.query(DailyLog).filter(DailyLog.user_id == test_user.id).count() == 1
+
+
+def test_put_daily_log_by_date_existing(authorized_client: TestClient, test_daily_log):
+    """Test that putting a log for a date that has one returns it"""
+    response = authorized_client.put(f"/api/v1/logs/by-date/{test_daily_log.date.isoformat()}")
+    assert response.status_code == 200
+    assert response.json()["id"] == test_daily_log.id
+
+
+def test_put_daily_log_by_date_invalid(authorized_client: TestClient):
+    """Test that a malformed date is rejected"""
+    response = authorized_client.put("/api/v1/logs/by-date/yesterday")
+    assert response.status_code == 422
+
+
+def test_get_log_by_date(authorized_client: TestClient, test_daily_log, test_food_entries, max_queries):
+    """Test looking up a log by date with its entries and foods"""
+    url = f"/api/v1/logs/by-date/{test_daily_log.date.isoformat()}"
+
+    # Revocation refresh, user lookup, log joined with entries and foods
+    with max_queries(3):
+        response = authorized_client.get(url)
+    assert response.status_code == 200
+
+    data = response.json()
+    assert data["id"] == test_daily_log.id
+    assert sorted(entry["quantity"] for entry in data["food_entries"]) == [1.0, 2.0]
+    assert all(entry["food"]["name"] for entry in data["food_entries"])
+
+
+def test_get_log_by_date_missing(authorized_client: TestClient, test_daily_log):
+    """Test looking up a date without a log"""
+    response = authorized_client.get(f"/api/v1/logs/by-date/{(test_daily_log.date - timedelta(days=1)).isoformat()}")
+    assert response.status_code == 404
+
+
+def test_get_logs_by_dates(authorized_client: TestClient, test_user, test_daily_log, test_food_entries,
+                           db_session: Session):
+    """Test looking up several dates at once"""
+    yesterday = test_daily_log.date - timedelta(days=1)
+    db_session.add(DailyLog(user_id=test_user.id, date=yesterday))
+    db_session.commit()
+
+    dates = [test_daily_log.date, yesterday, yesterday - timedelta(days=1)]
+    response = authorized_client.get(f"/api/v1/logs/by-date/?dates={','.join(d.isoformat() for d in dates)}")
+    assert response.status_code == 200
+
+    data = response.json()
+    assert [log["date"] for log in data] == [yesterday.isoformat(), test_daily_log.date.isoformat()]
+    assert data[0]["food_entries"] == []
+    assert len(data[1]["food_entries"]) == 2
+
+
+@pytest.mark.parametrize("dates", ["", "2024-13-01", ",".join(["2024-01-01"] * 367)])
+def test_get_logs_by_dates_invalid(authorized_client: TestClient, dates):
+    """Test that empty, malformed or too many dates are rejected"""
+    response = authorized_client.get(f"/api/v1/logs/by-date/?dates={dates}")
+    assert response.status_code == 400
+
+
 def test_get_user_logs(authorized_client: TestClient, test_user, test_daily_log, db_session: Session):
     """Test getting all logs for current user"""
     tomorrow = date.today() + timedelta(days=1)
@@ -81,6 +157,60 @@ def test_get_user_logs(authorized_client: TestClient, test_user, test_daily_log,
     assert tomorrow.isoformat() in dates
 
 
+def test_get_user_logs_cursor_pages(authorized_client: TestClient, test_user, test_daily_log, db_session: Session):
+    """Test that log pages follow each other by date"""
+    for days in (3, 1, 2):
+        db_session.add(DailyLog(user_id=test_user.id, date=date.today() + timedelta(days=days)))
+    db_session.commit()
+
+    dates, cursor = [], None
+    while True:
+        response = authorized_client.get("/api/v1/logs/?limit=3" + (f"&cursor={cursor}" if cursor else ""))
+        assert response.status_code == 200
+        dates.extend(log["date"] for log in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert dates == [(date.today() + timedelta(days=days)).isoformat() for days in range(4)]
+
+
+def test_get_user_logs_envelope(authorized_client: TestClient, test_user, test_daily_log, db_session: Session):
+    """Test that a user's log total only counts their own logs"""
+    other = User(username="other", email="other@example.com", hashed_password="x")
+    db_session.add(other)
+    db_session.flush()
+    db_session.add(DailyLog(user_id=other.id, date=date.today()))
+    db_session.add(DailyLog(user_id=test_user.id, date=date.today() + timedelta(days=1)))
+    db_session.commit()
+
+    response = authorized_client.get("/api/v1/logs/?envelope=true&limit=1&expand=food_entries")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 2
+    assert data["items"][0]["food_entries"] == []
+    assert data["next_cursor"] is not None
+
+
+def test_get_user_logs_query_count(authorized_client: TestClient, test_user, test_daily_log,
+                                  test_food_entries, db_session: Session, max_queries):
+    """Test that listing logs doesn't issue a query per log"""
+    for days in range(1, 6):
+        db_session.add(DailyLog(user_id=test_user.id, date=date.today() + timedelta(days=days)))
+    db_session.commit()
+
+    # Revocation refresh, user lookup, logs
+    with max_queries(3):
+        response = authorized_client.get("/api/v1/logs/")
+    assert response.status_code == 200
+    assert response.headers["X-DB-Query-Count"] == "3"
+    assert float(response.headers["X-DB-Query-Time-Ms"]) > 0
+
+    # Expanded entries and their foods add one selectin query
+    with max_queries(4):
+        response = authorized_client.get("/api/v1/logs/?expand=food_entries")
+    assert response.status_code == 200
+
+
 def test_get_user_logs_empty(authorized_client: TestClient, test_user, db_session: Session):
     """Test getting logs when user has no logs"""
     # Delete logs for this user only
@@ -95,6 +225,203 @@ def test_get_user_logs_empty(authorized_client: TestClient, test_user, db_sessio
     assert len(data) == 0
 
 
+def test_get_log_slim_by_default(authorized_client: TestClient, test_daily_log, test_food_entries):
+    """Test that relations are left out unless expanded"""
+    response = authorized_client.get(f"/api/v1/logs/{test_daily_log.id}")
+    assert response.status_code == 200
+    assert set(response.json()) == {"id", "user_id", "date"}
+
+
+def test_get_log_expanded(authorized_client: TestClient, test_user, test_daily_log, test_food_entries):
+    """Test embedding the user and food entries with ?expand="""
+    response = authorized_client.get(f"/api/v1/logs/{test_daily_log.id}?expand=user,food_entries")
+    assert response.status_code == 200
+
+    data = response.json()
+    assert data["user"]["username"] == test_user.username
+    assert "logs" not in data["user"]
+    assert len(data["food_entries"]) == 2
+    assert {entry["food"]["name"] for entry in data["food_entries"]} == {"Apple", "Chicken Breast"}
+
+
+def test_get_log_totals(authorized_client: TestClient, test_daily_log, test_food_entries, max_queries):
+    """Test summing a log's calories and macros"""
+    url = f"/api/v1/logs/{test_daily_log.id}/totals"
+
+    # Revocation refresh, user lookup, totals
+    with max_queries(3):
+        response = authorized_client.get(url)
+    assert response.status_code == 200
+    assert response.json() == pytest.approx({"calories": 382, "protein": 62.3, "carbs": 14, "fat": 7.4})
+
+
+def test_get_log_totals_empty(authorized_client: TestClient, test_daily_log):
+    """Test that a log without entries totals zero"""
+    response = authorized_client.get(f"/api/v1/logs/{test_daily_log.id}/totals")
+    assert response.status_code == 200
+    assert response.json() == {"calories": 0, "protein": 0, "carbs": 0, "fat": 0}
+
+
+def test_get_log_totals_other_user(authorized_client: TestClient, db_session: Session, test_admin):
+    """Test that another user's log totals are not found"""
+    other_log = DailyLog(user_id=test_admin.id, date=date.today())
+    db_session.add(other_log)
+    db_session.commit()
+
+    response = authorized_client.get(f"/api/v1/logs/{other_log.id}/totals")
+    assert response.status_code == 404
+
+
+def test_get_logs_expand_totals(authorized_client: TestClient, test_user, test_daily_log, test_food_entries,
+                                db_session: Session, max_queries):
+    """Test embedding totals on a page of logs, read from the stored columns without an extra query"""
+    db_session.add(DailyLog(user_id=test_user.id, date=date.today() + timedelta(days=1)))
+    db_session.commit()
+
+    # Revocation refresh, user lookup, logs
+    with max_queries(3):
+        response = authorized_client.get("/api/v1/logs/?expand=totals")
+    assert response.status_code == 200
+
+    data = response.json()
+    assert data[0]["totals"]["calories"] == pytest.approx(382)
+    assert data[1]["totals"] == {"calories": 0, "protein": 0, "carbs": 0, "fat": 0}
+    assert "food_entries" not in data[0]
+
+
+@pytest.fixture
+def summary_logs(db_session: Session, test_user):
+    for day, calories in [(date(2024, 1, 1), 100), (date(2024, 1, 2), 200), (date(2024, 1, 8), 300), (date(2024, 2, 1), 400)]:
+        db_session.add(DailyLog(user_id=test_user.id, date=day, total_calories=calories, total_protein=calories / 10))
+    db_session.commit()
+
+
+@pytest.mark.parametrize("bucket, expected", [
+    ("day", [("2024-01-01", 1, 100), ("2024-01-02", 1, 200), ("2024-01-08", 1, 300), ("2024-02-01", 1, 400)]),
+    ("week", [("2024-01-01", 2, 300), ("2024-01-08", 1, 300), ("2024-01-29", 1, 400)]),
+    ("month", [("2024-01-01", 3, 600), ("2024-02-01", 1, 400)]),
+])
+def test_get_log_summary(authorized_client: TestClient, summary_logs, max_queries, bucket, expected):
+    """Test rolling log totals up per day, week and month"""
+    # Revocation refresh, user lookup, summary
+    with max_queries(3):
+        response = authorized_client.get(f"/api/v1/logs/summary?from=2024-01-01&to=2024-12-31&bucket={bucket}")
+    assert response.status_code == 200
+
+    data = response.json()
+    assert (data["from"], data["to"], data["bucket"]) == ("2024-01-01", "2024-12-31", bucket)
+    assert [(b["start"], b["days_logged"], b["totals"]["calories"]) for b in data["buckets"]] == expected
+    for b in data["buckets"]:
+        assert b["averages"]["calories"] == pytest.approx(b["totals"]["calories"] / b["days_logged"])
+        assert b["totals"]["protein"] == pytest.approx(b["totals"]["calories"] / 10)
+
+
+def test_get_log_summary_range(authorized_client: TestClient, summary_logs):
+    """Test that the range bounds are inclusive and default to the last 30 days"""
+    response = authorized_client.get("/api/v1/logs/summary?from=2024-01-02&to=2024-01-08&bucket=month")
+    assert response.json()["buckets"][0]["totals"]["calories"] == 500
+
+    response = authorized_client.get("/api/v1/logs/summary")
+    assert response.status_code == 200
+    assert response.json()["to"] == date.today().isoformat()
+    assert response.json()["buckets"] == []
+
+
+@pytest.mark.parametrize("query, status_code", [("from=2024-02-01&to=2024-01-01", 400), ("bucket=year", 422)])
+def test_get_log_summary_invalid(authorized_client: TestClient, query, status_code):
+    """Test that reversed ranges and unknown buckets are rejected"""
+    response = authorized_client.get(f"/api/v1/logs/summary?{query}")
+    assert response.status_code == status_code
+
+
+def test_get_log_trends(authorized_client: TestClient, summary_logs, max_queries):
+    """Test daily series with averages over the days logged and deltas between logged days"""
+    # Revocation refresh, user lookup, totals
+    with max_queries(3):
+        response = authorized_client.get("/api/v1/logs/trends?from=2024-01-02&to=2024-01-08")
+    assert response.status_code == 200
+
+    data = response.json()
+    assert (data["from"], data["to"]) == ("2024-01-02", "2024-01-08")
+    assert data["dates"] == [f"2024-01-0{day}" for day in range(2, 9)]
+    assert data["totals"]["calories"] == [200, None, None, None, None, None, 300]
+    # The day before the range still counts towards its averages and deltas
+    assert data["moving_averages"]["7"]["calories"] == [150, 150, 150, 150, 150, 150, 250]
+    assert data["moving_averages"]["30"]["calories"][-1] == 200
+    assert data["deltas"]["calories"] == [100] + [None] * 6
+    assert data["macro_percentages"]["protein"] == [100] + [None] * 5 + [100]
+
+
+def test_get_log_trends_defaults(authorized_client: TestClient, summary_logs):
+    """Test that the range defaults to the last 90 days"""
+    response = authorized_client.get("/api/v1/logs/trends")
+    assert response.status_code == 200
+
+    data = response.json()
+    assert data["to"] == date.today().isoformat()
+    assert len(data["dates"]) == 90
+    assert set(data["totals"]["calories"]) == {None}
+
+
+@pytest.mark.parametrize("query", ["from=2024-02-01&to=2024-01-01", "from=2000-01-01&to=2024-01-01"])
+def test_get_log_trends_invalid(authorized_client: TestClient, query):
+    """Test that reversed and overly long ranges are rejected"""
+    response = authorized_client.get(f"/api/v1/logs/trends?{query}")
+    assert response.status_code == 400
+
+
+@pytest.mark.benchmark
+def test_log_trends_benchmark(authorized_client: TestClient, db_session: Session, test_user):
+    """Benchmark /logs/trends over five years of daily logs"""
+    import asyncio
+    import time
+    from sqlalchemy import insert
+    from backend.analytics import get_trends
+
+    start, days = date(2019, 1, 1), 5 * 365 + 1
+    db_session.execute(insert(DailyLog), [
+        {
+            "user_id": test_user.id, "date": start + timedelta(days=day), "total_calories": 1800 + day % 400,
+            "total_protein": 100 + day % 50, "total_carbs": 200 + day % 80, "total_fat": 60 + day % 30
+        }
+        for day in range(days)
+    ])
+    db_session.commit()
+    end = start + timedelta(days=days - 1)
+    url = f"/api/v1/logs/trends?from={start}&to={end}"
+    rounds = 10
+
+    asyncio.run(get_trends(db_session, test_user.id, start, end))
+    began = time.perf_counter()
+    for _ in range(rounds):
+        asyncio.run(get_trends(db_session, test_user.id, start, end))
+    analytics = (time.perf_counter() - began) / rounds
+
+    authorized_client.get(url)
+    began = time.perf_counter()
+    for _ in range(rounds):
+        response = authorized_client.get(url)
+    request = (time.perf_counter() - began) / rounds
+
+    print(f"trends over {days} days: query + series {analytics * 1e3:.1f}ms; GET /logs/trends {request * 1e3:.1f}ms")
+    assert response.status_code == 200
+    assert len(response.json()["moving_averages"]["30"]["calories"]) == days
+
+
+def test_get_logs_fields(authorized_client: TestClient, test_daily_log):
+    """Test limiting the returned fields with ?fields="""
+    response = authorized_client.get("/api/v1/logs/?fields=id,date")
+    assert response.status_code == 200
+    assert response.json() == [{"id": test_daily_log.id, "date": test_daily_log.date.isoformat()}]
+
+
+def test_get_logs_unknown_expand(authorized_client: TestClient, test_daily_log):
+    """Test that unknown relations are rejected"""
+    response = authorized_client.get("/api/v1/logs/?expand=friends")
+    assert response.status_code == 400
+    assert "friends" in response.json()["detail"]
+
+
 def test_get_log_by_id(authorized_client: TestClient, test_daily_log):
     """Test getting a specific log by ID"""
     response = authorized_client.get(f"/api/v1/logs/{test_daily_log.id}")
@@ -159,6 +486,23 @@ def test_delete_log(authorized_client: TestClient, test_daily_log, db_session: S
     assert deleted_log is None
 
 
+def test_delete_log_with_entries(authorized_client: TestClient, test_daily_log, test_foods, db_session: Session,
+                                 max_queries):
+    """Test that entries deleted along with their log don't adjust its totals"""
+    log_id = test_daily_log.id
+    db_session.add_all([
+        FoodEntry(daily_log_id=log_id, food_id=test_foods[index % len(test_foods)].id, quantity=1.0)
+        for index in range(20)
+    ])
+    db_session.commit()
+
+    # Revocation refresh, user lookup, log, entries, entry and log deletes
+    with max_queries(6):
+        response = authorized_client.delete(f"/api/v1/logs/{log_id}")
+    assert response.status_code == 204
+    assert db_session.query(FoodEntry).filter(FoodEntry.daily_log_id == log_id).count() == 0
+
+
 def test_delete_nonexistent_log(authorized_client: TestClient):
     """Test deleting a non-existent log"""
     response = authorized_client.delete("/api/v1/logs/9999")
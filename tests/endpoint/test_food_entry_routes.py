@@ -51,6 +51,23 @@ def test_create_food_entry_nonexistent_food(authorized_client: TestClient, test_
     assert "Food not found" in response.json()["detail"]
 
 
+def test_create_food_entry_cached_food(authorized_client: TestClient, test_daily_log, test_foods):
+    """Test that food_id is validated from the catalog cache once the food has been read"""
+    from backend.crud.food import food_cache
+    from backend.database.queries import track_queries
+
+    url = f"/api/v1/logs/{test_daily_log.id}/entries/"
+    entry_data = {"daily_log_id": test_daily_log.id, "food_id": test_foods[2].id, "quantity": 1}
+    assert authorized_client.post(url, json=entry_data).status_code == 201
+    food_cache.clear()
+
+    with track_queries() as miss:
+        assert authorized_client.post(url, json=entry_data).status_code == 201
+    with track_queries() as hit:
+        assert authorized_client.post(url, json=entry_data).status_code == 201
+    assert hit.count == miss.count - 1
+
+
 def test_create_food_entry_other_users_log(authorized_client: TestClient, db_session: Session, test_admin, test_foods):
     """Test creating a food entry for another user's log"""
     admin_log = DailyLog(user_id=test_admin.id, date="2023-01-01")
@@ -192,3 +209,28 @@ def test_delete_nonexistent_food_entry(authorized_client: TestClient, test_daily
     response = authorized_client.delete(f"/api/v1/logs/{test_daily_log.id}/entries/9999")
     assert response.status_code == 404
     assert "Food entry not found" in response.json()["detail"]
+
+
+
+def test_entry_writes_update_log_totals(authorized_client: TestClient, test_daily_log, test_food_entries, test_foods):
+    """Test that creating, updating and deleting entries keeps the log's totals current"""
+    log_id = test_daily_log.id
+    totals_url = f"/api/v1/logs/{log_id}/totals"
+    assert authorized_client.get(totals_url).json()["calories"] == pytest.approx(382)
+
+    # Brown rice, 112 kcal
+    response = authorized_client.post(
+        f"/api/v1/logs/{log_id}/entries/", json={"daily_log_id": log_id, "food_id": test_foods[2].id, "quantity": 2}
+    )
+    assert response.status_code == 201
+    entry_id = response.json()["id"]
+    assert authorized_client.get(totals_url).json()["calories"] == pytest.approx(606)
+
+    response = authorized_client.put(f"/api/v1/logs/{log_id}/entries/{entry_id}", json={"quantity": 0.5})
+    assert response.status_code == 200
+    assert authorized_client.get(totals_url).json()["calories"] == pytest.approx(438)
+
+    assert authorized_client.delete(f"/api/v1/logs/{log_id}/entries/{entry_id}").status_code == 204
+    assert authorized_client.get(totals_url).json() == pytest.approx(
+        {"calories": 382, "protein": 62.3, "carbs": 14, "fat": 7.4}
+    )
@@ -1,7 +1,10 @@
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
+from backend.config import settings
+from backend.crud.pagination import encode_cursor
 from backend.main import app
 from backend.models import Food
 
@@ -22,6 +25,58 @@ def test_get_all_foods(client: TestClient, test_foods):
         assert name in food_names
 
 
+def test_get_foods_cursor_pages(client: TestClient, test_foods):
+    """Test walking the food list one page at a time with X-Next-Cursor"""
+    response = client.get("/api/v1/foods/?limit=2")
+    assert response.status_code == 200
+    first = response.json()
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = client.get(f"/api/v1/foods/?limit=2&cursor={cursor}")
+    assert response.status_code == 200
+    assert "X-Next-Cursor" not in response.headers
+    names = [food["name"] for food in first + response.json()]
+    assert names == [food.name for food in sorted(test_foods, key=lambda food: food.id)]
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", encode_cursor(["abc"]), encode_cursor([{"a": 1}])])
+def test_get_foods_invalid_cursor(client: TestClient, cursor):
+    """Test that a malformed or tampered cursor is rejected"""
+    response = client.get(f"/api/v1/foods/?cursor={cursor}")
+    assert response.status_code == 400
+
+
+def test_get_foods_envelope(client: TestClient, test_foods, max_queries):
+    """Test that the envelope carries the total counted in the page's query"""
+    client.get("/api/v1/foods/?envelope=true")  # caches the table's row estimate
+
+    with max_queries(1):
+        response = client.get("/api/v1/foods/?envelope=true&limit=2")
+    assert response.status_code == 200
+
+    data = response.json()
+    assert len(data["items"]) == 2
+    assert data["total"] == 3
+    assert data["total_exact"] is True
+    assert data["next_cursor"] == response.headers["X-Next-Cursor"]
+
+    response = client.get(f"/api/v1/foods/?envelope=true&limit=2&cursor={data['next_cursor']}")
+    data = response.json()
+    assert len(data["items"]) == 1
+    assert data["total"] == 3
+    assert data["next_cursor"] is None
+
+
+def test_get_foods_envelope_estimated(client: TestClient, test_foods, db_session: Session, monkeypatch):
+    """Test that totals of large unfiltered tables come from the planner estimate"""
+    monkeypatch.setattr(settings, "PAGE_TOTAL_ESTIMATE_ROWS", 2)
+    db_session.execute(text("ANALYZE foods"))
+
+    data = client.get("/api/v1/foods/?envelope=true").json()
+    assert data["total"] == 3
+    assert data["total_exact"] is False
+
+
 def test_get_food_by_id(client: TestClient, test_foods):
     """Test getting a specific food by ID"""
     food_id = test_foods[0].id
@@ -72,6 +127,62 @@ def test_create_food_admin(admin_client: TestClient, db_session: Session):
     assert created_food.name == food_data["name"]
 
 
+def test_create_foods_bulk(admin_client: TestClient, test_foods, max_queries):
+    """Test bulk creating foods, with rows that clash reported by index"""
+    foods = [
+        {"name": f"Bulk food {i}", "manufacturer": "Bulk", "unit": "g", "calories": i}
+        for i in range(50)
+    ]
+    foods[10] = {"name": "Apple", "manufacturer": "Generic", "unit": "g"}
+
+    response = admin_client.post("/api/v1/foods/bulk", json=foods)
+    assert response.status_code == 201
+
+    data = response.json()
+    assert len(data["items"]) == 49
+    assert data["items"][0]["name"] == "Bulk food 0"
+    assert [error["index"] for error in data["errors"]] == [10]
+
+    # Without clashes the batch is a single INSERT, whatever its size
+    with max_queries(5):
+        response = admin_client.post("/api/v1/foods/bulk", json=[{**food, "manufacturer": "Other"} for food in foods])
+    assert response.json()["errors"] == []
+
+
+def test_update_foods_bulk(admin_client: TestClient, test_foods):
+    """Test bulk updating foods by id"""
+    response = admin_client.put("/api/v1/foods/bulk", json=[
+        {"id": test_foods[0].id, "calories": 55},
+        {"id": 99999, "calories": 1},
+        {"id": test_foods[2].id, "unit": "cup"}
+    ])
+    assert response.status_code == 200
+
+    data = response.json()
+    assert [(food["id"], food["calories"], food["unit"]) for food in data["items"]] == [
+        (test_foods[0].id, 55, test_foods[0].unit),
+        (test_foods[2].id, test_foods[2].calories, "cup")
+    ]
+    assert [error["index"] for error in data["errors"]] == [1]
+
+
+def test_update_foods_bulk_repeated_id(admin_client: TestClient, test_foods):
+    """Test that an id sent twice rejects the whole batch"""
+    response = admin_client.put("/api/v1/foods/bulk", json=[
+        {"id": test_foods[0].id, "calories": 55},
+        {"id": test_foods[0].id, "calories": 60}
+    ])
+    assert response.status_code == 400
+    assert "repeats id" in response.json()["detail"]
+    assert admin_client.get(f"/api/v1/foods/{test_foods[0].id}").json()["calories"] == test_foods[0].calories
+
+
+def test_create_foods_bulk_non_admin(authorized_client: TestClient):
+    """Test that bulk creation is admin only"""
+    response = authorized_client.post("/api/v1/foods/bulk", json=[])
+    assert response.status_code == 403
+
+
 def test_create_food_non_admin(authorized_client: TestClient):
     """Test creating a food as non-admin user"""
     food_data = {
@@ -227,3 +338,33 @@ def test_search_foods(client: TestClient, test_foods, db_session: Session):
     data = response.json()
     assert isinstance(data, list)
     assert len(data) == 0
+
+
+def test_food_writes_unit_of_work(admin_client: TestClient, db_session: Session, monkeypatch):
+    """Test that the unit of work takes fewer round trips for the food write endpoints"""
+    from sqlalchemy import event
+    from backend.database.queries import track_queries
+
+    commits = []
+    event.listen(db_session, "after_commit", lambda session: commits.append(1))
+
+    def write_requests(name):
+        food = {
+            "name": name, "calories": 208, "protein": 20, "carbs": 0, "fat": 13,
+            "serving_size": 100.0, "unit": "g", "manufacturer": "Test Manufacturer"
+        }
+        created = admin_client.post("/api/v1/foods/", json=food)
+        assert created.status_code == 201
+        food_id = created.json()["id"]
+        assert admin_client.put(f"/api/v1/foods/{food_id}", json={**food, "calories": 210}).status_code == 200
+        assert admin_client.delete(f"/api/v1/foods/{food_id}").status_code == 204
+
+    round_trips = {}
+    for unit_of_work in (False, True):
+        monkeypatch.setattr(settings, "DATABASE_UNIT_OF_WORK", unit_of_work)
+        commits.clear()
+        with track_queries() as queries:
+            write_requests(f"Salmon {unit_of_work}")
+        round_trips[unit_of_work] = queries.count + len(commits)
+
+    assert round_trips[True] < round_trips[False]
@@ -4,7 +4,10 @@ from sqlalchemy.orm import Session
 
 from backend.main import app
 from backend.models import User
+from backend.auth import create_user_token
 from backend.auth.security import get_password_hash
+from backend.config import settings
+from backend.crud.user import user_crud
 
 
 def test_get_all_users_admin(admin_client: TestClient, db_session: Session, test_user, test_admin):
@@ -21,6 +24,17 @@ def test_get_all_users_admin(admin_client: TestClient, db_session: Session, test
     assert test_admin.username in usernames
 
 
+def test_get_all_users_expand_logs(admin_client: TestClient, test_user, test_admin, test_daily_log):
+    """Test that logs are only embedded when expanded"""
+    users = admin_client.get("/api/v1/users/").json()
+    assert all("logs" not in user for user in users)
+
+    users = admin_client.get("/api/v1/users/?expand=logs").json()
+    logs = {user["username"]: user["logs"] for user in users}
+    assert [log["id"] for log in logs[test_user.username]] == [test_daily_log.id]
+    assert logs[test_admin.username] == []
+
+
 def test_get_all_users_non_admin(authorized_client: TestClient):
     """Test getting all users as non-admin user"""
     response = authorized_client.get("/api/v1/users/")
@@ -88,6 +102,18 @@ def test_update_user_to_existing_username(admin_client: TestClient, test_user, t
     assert "already registered" in response.json()["detail"]
 
 
+def test_update_user_to_existing_username_other_case(admin_client: TestClient, test_user, test_admin, max_queries):
+    """Test that usernames differing only in case are rejected by the unique index"""
+    url = f"/api/v1/users/{test_user.id}"
+    update_data = {"username": test_admin.username.upper(), "email": "new@example.com", "hashed_password": "newpassword123"}
+
+    # Revocation refresh, admin lookup, user lookup, update
+    with max_queries(4):
+        response = admin_client.put(url, json=update_data)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Username already registered"
+
+
 def test_update_user_to_existing_email(admin_client: TestClient, test_user, test_admin):
     """Test updating user to an already existing email"""
     update_data = {
@@ -145,3 +171,53 @@ def test_delete_user_non_admin(authorized_client: TestClient, test_admin):
     response = authorized_client.delete(f"/api/v1/users/{test_admin.id}")
     assert response.status_code == 403
     assert "Insufficient permissions" in response.json()["detail"]
+
+
+def test_deactivate_user_invalidates_cached_user(authorized_client: TestClient, test_user, db_session: Session):
+    """Test that deactivating a user drops their cached principal"""
+    assert authorized_client.get("/api/v1/logs/").status_code == 200
+
+    user_crud.deactivate_user(db_session, test_user)
+
+    response = authorized_client.get("/api/v1/logs/")
+    assert response.status_code == 400
+    assert "Inactive user" in response.json()["detail"]
+
+
+def test_stateless_token_revoked_on_role_change(client: TestClient, test_user, db_session: Session, monkeypatch):
+    """Test that changing a claim held in a stateless token revokes the token"""
+    monkeypatch.setattr(settings, "AUTH_STATELESS", True)
+    client.headers = {"Authorization": f"Bearer {create_user_token(test_user)}"}
+    assert client.get("/api/v1/logs/").status_code == 200
+
+    user_crud.update(db_session, test_user, {"role": "admin"})
+
+    assert client.get("/api/v1/logs/").status_code == 401
+
+
+def test_stateless_token_revoked_on_deactivate(client: TestClient, test_user, db_session: Session, monkeypatch):
+    """Test that deactivating a user revokes their stateless tokens"""
+    monkeypatch.setattr(settings, "AUTH_STATELESS", True)
+    client.headers = {"Authorization": f"Bearer {create_user_token(test_user)}"}
+    assert client.get("/api/v1/logs/").status_code == 200
+
+    user_crud.deactivate_user(db_session, test_user)
+
+    assert client.get("/api/v1/logs/").status_code == 401
+
+    # A token issued after the bump carries active=False and is turned away as inactive
+    client.headers = {"Authorization": f"Bearer {create_user_token(test_user)}"}
+    response = client.get("/api/v1/logs/")
+    assert response.status_code == 400
+    assert "Inactive user" in response.json()["detail"]
+
+
+def test_cache_stats_admin(admin_client: TestClient, test_admin):
+    """Test that cache counters are exposed to admins"""
+    admin_client.get("/api/v1/auth/me")
+    response = admin_client.get("/api/v1/admin/cache-stats")
+    assert response.status_code == 200
+
+    users = response.json()["caches"]["users"]
+    assert users["hits"] >= 1
+    assert users["misses"] >= 1
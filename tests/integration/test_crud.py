@@ -1,9 +1,21 @@
+import threading
+
 import pytest
-from sqlalchemy import create_engine, inspect
+from datetime import date
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 
 from backend.database.db import Base
 from backend.crud import user_crud, food_crud, daily_log_crud, food_entry_crud
+from backend.crud.loaders import Loaders
+from backend.crud.pagination import InvalidCursor, encode_cursor
+from backend.crud.food import food_cache
+from backend.crud.totals import reconcile
+from backend.crud.user import token_versions
+from backend.database.db import on_commit
+from backend.database.queries import track_queries
 from backend.schemas.user import UserCreate
 from backend.schemas.food import FoodCreate
 from backend.schemas.daily_log import DailyLogCreate
@@ -92,6 +104,27 @@ def test_user_crud_create_duplicate_email(db_session):
         user_crud.create(db_session, duplicate_schema)
     assert "email" in str(exc.value).lower()
 
+@pytest.mark.parametrize("username, email, message", [
+    ("testuser", "other@example.com", "Username already registered"),
+    ("other", "test@example.com", "Email already registered"),
+    ("TESTUSER", "other@example.com", "Username already registered"),
+    ("other", "TEST@example.com", "Email already registered"),
+])
+def test_user_crud_duplicate_maps_to_registration_error(db_session, username, email, message):
+    user_crud.create(db_session, UserCreate(username="testuser", email="test@example.com", hashed_password="hashed_password_placeholder"))
+
+    with pytest.raises(ValueError, match=message):
+        user_crud.create(db_session, UserCreate(username=username, email=email, hashed_password="hashed_password_placeholder"))
+
+def test_user_crud_get_by_identifier(db_session):
+    user = user_crud.create(db_session, UserCreate(username="TestUser", email="Test@Example.com", hashed_password="hashed_password_placeholder"))
+    # Another account whose username looks like the first one's email
+    user_crud.create(db_session, {"username": "test@example.com", "email": "someone@example.com", "hashed_password": "hashed_password_placeholder"})
+
+    assert user_crud.get_by_identifier(db_session, "testuser").id == user.id
+    assert user_crud.get_by_identifier(db_session, "Test@Example.com").username == "test@example.com"
+    assert user_crud.get_by_identifier(db_session, "nobody") is None
+
 def test_user_crud_update_to_existing_username(db_session):
     # Create two users
     user1 = user_crud.create(db_session, UserCreate(username="user1", email="user1@example.com", hashed_password="hashed_password_placeholder"))
@@ -241,6 +274,32 @@ def test_daily_log_crud_create_invalid_user_id(db_session):
         daily_log_crud.create(db_session, log_schema)
     assert "user" in str(exc.value).lower()
 
+def test_daily_log_crud_get_or_create(db_session):
+    user_id = user_crud.create(db_session, UserCreate(username="testuser", email="test@example.com", hashed_password="hashed_password_placeholder")).id
+
+    with track_queries() as queries:
+        log, created = daily_log_crud.get_or_create(db_session, user_id, date(2024, 1, 1))
+        again, created_again = daily_log_crud.get_or_create(db_session, user_id, date(2024, 1, 1))
+
+    assert created and not created_again
+    assert again is log
+    assert queries.count == 2
+    assert len(daily_log_crud.get_many_from_user(db_session, limit=10, id=user_id)) == 1
+
+def test_daily_log_crud_get_or_create_leaves_existing_log(db_session):
+    user_id = user_crud.create(db_session, UserCreate(username="testuser", email="test@example.com", hashed_password="hashed_password_placeholder")).id
+    log, created = daily_log_crud.get_or_create(db_session, user_id, date(2024, 1, 1))
+    assert created and db_session.info.pop("wrote")
+    row_version = text("SELECT xmin::text FROM daily_logs WHERE id = :id")
+    version = db_session.execute(row_version, {"id": log.id}).scalar()
+
+    again, created_again = daily_log_crud.get_or_create(db_session, user_id, date(2024, 1, 1))
+
+    # Not rewritten, so no dead tuple, and not counted as a write for replica routing
+    assert again.id == log.id and not created_again
+    assert db_session.execute(row_version, {"id": log.id}).scalar() == version
+    assert "wrote" not in db_session.info
+
 # Food Entry CRUD Tests
 def test_food_entry_crud_create_invalid_log_id(db_session):
     # Create food but use invalid log_id
@@ -270,3 +329,376 @@ def test_food_entry_crud_create_invalid_food_id(db_session):
     with pytest.raises(ValueError) as exc:
         food_entry_crud.create(db_session, entry_schema)
     assert "food" in str(exc.value).lower()
+
+# Bulk writes
+def _food(name, **kwargs):
+    return FoodCreate(name=name, manufacturer="Generic", unit="g", **kwargs)
+
+def test_crud_bulk_create_returns_rows_in_order(db_session):
+    result = food_crud.bulk_create(db_session, [_food(f"Food {i}", calories=i) for i in range(5)])
+
+    assert result.errors == []
+    assert [row.name for row in result.items] == [f"Food {i}" for i in range(5)]
+    assert [row.calories for row in result.items] == list(range(5))
+    assert result.items[0].serving_size == 1.0  # schema defaults are written
+    assert len(food_crud.get_many(db_session, limit=10)) == 5
+
+def test_crud_bulk_create_reports_rejected_rows(db_session):
+    food_crud.create(db_session, {"name": "Apple", "manufacturer": "Generic", "serving_size": 1, "unit": "g",
+                                  "calories": 52, "protein": 0, "carbs": 14, "fat": 0})
+
+    result = food_crud.bulk_create(db_session, [_food("Pear"), _food("Apple"), _food("Plum"), _food("Pear")])
+
+    assert [row.name for row in result.items] == ["Pear", "Plum"]
+    assert [error["index"] for error in result.errors] == [1, 3]
+    assert "uq_name_manufacturer" in result.errors[0]["error"]
+    assert len(food_crud.get_many(db_session, limit=10)) == 3
+
+@pytest.mark.parametrize("bad_index", [0, 37, 63])
+def test_crud_bulk_writes_bisect_rejected_batch(db_session, bad_index):
+    foods = food_crud.bulk_create(db_session, [_food(f"Food {i}") for i in range(64)]).items
+
+    # One bad row in 64 is found in 2 * log2(64) + 1 savepoints rather than
+    # one per row; each holds the savepoint, its release and the writes
+    rows = [_food(f"New {i}") for i in range(64)]
+    rows[bad_index] = _food("Food 0")
+    with track_queries() as queries:
+        result = food_crud.bulk_create(db_session, rows)
+    assert [error["index"] for error in result.errors] == [bad_index]
+    assert len(result.items) == 63
+    assert queries.count <= 3 * 13 + 1
+
+    rows = [{"id": food.id, "calories": 5} for food in foods]
+    rows[bad_index] = {"id": foods[bad_index].id, "name": "Food 1"}
+    with track_queries() as queries:
+        result = food_crud.bulk_update(db_session, rows)
+    assert [error["index"] for error in result.errors] == [bad_index]
+    assert [row.id for row in result.items] == [food.id for index, food in enumerate(foods) if index != bad_index]
+    assert queries.count <= 5 * 13 + 1
+
+def test_crud_bulk_update(db_session):
+    created = food_crud.bulk_create(db_session, [_food("Pear"), _food("Plum"), _food("Fig")]).items
+
+    result = food_crud.bulk_update(db_session, [
+        {"id": created[0].id, "calories": 57},
+        {"id": created[1].id, "name": "Fig"},
+        {"id": 99999, "calories": 1},
+        {"id": created[2].id, "calories": 74, "protein": 0.8},
+    ])
+
+    assert [(row.name, row.calories) for row in result.items] == [("Pear", 57), ("Fig", 74)]
+    assert [error["index"] for error in result.errors] == [1, 2]
+    assert "uq_name_manufacturer" in result.errors[0]["error"]
+    assert "not found" in result.errors[1]["error"]
+
+def test_crud_bulk_update_rejects_repeated_id(db_session):
+    food = food_crud.bulk_create(db_session, [_food("Pear")]).items[0]
+
+    with pytest.raises(ValueError, match="repeats id"):
+        food_crud.bulk_update(db_session, [{"id": food.id, "calories": 57}, {"id": food.id, "calories": 60}])
+
+# Unit of work
+@pytest.fixture
+def unit_of_work(db_session):
+    db_session.info["unit_of_work"] = True
+    yield db_session
+    db_session.info.pop("unit_of_work", None)
+
+def test_crud_unit_of_work_flushes_without_refresh(unit_of_work):
+    with track_queries() as queries:
+        food = food_crud.create(unit_of_work, {"name": "Pear", "manufacturer": "Generic", "serving_size": 1, "unit": "g",
+                                               "calories": 57, "protein": 0, "carbs": 15, "fat": 0})
+        food_crud.update(unit_of_work, food, {"serving_size": 2})
+        food_crud.delete(unit_of_work, food)
+
+    assert food.id is not None
+    assert [statement.split()[0] for statement in queries.statements] == ["INSERT", "UPDATE", "DELETE"]
+
+def test_crud_unit_of_work_defers_on_commit(unit_of_work):
+    calls = []
+    on_commit(unit_of_work, lambda: calls.append("first"))
+    on_commit(unit_of_work, lambda: calls.append("second"))
+    assert calls == []
+
+    unit_of_work.commit()
+    assert calls == ["first", "second"]
+
+    food_crud.create(unit_of_work, {"name": "Pear", "manufacturer": "Generic", "serving_size": 1, "unit": "g",
+                                    "calories": 57, "protein": 0, "carbs": 15, "fat": 0})
+    on_commit(unit_of_work, lambda: calls.append("rolled back"))
+    unit_of_work.rollback()
+    unit_of_work.commit()
+    assert calls == ["first", "second"]
+
+@pytest.mark.asyncio
+async def test_user_crud_unit_of_work_forgets_token_version_on_commit(unit_of_work):
+    user = user_crud.create(unit_of_work, UserCreate(username="testuser", email="test@example.com", hashed_password="hashed_password_placeholder"))
+    unit_of_work.commit()
+    assert await token_versions.get(unit_of_work, user.id) == 0
+
+    user_crud.update(unit_of_work, user, {"role": "admin"})
+    assert await token_versions.get(unit_of_work, user.id) == 0
+
+    unit_of_work.commit()
+    assert user.token_version == 1
+    assert await token_versions.get(unit_of_work, user.id) == 1
+    assert token_versions.stats()["size"] == 1
+
+@pytest.mark.asyncio
+async def test_token_versions_discard_outlives_refresh(db_session):
+    user = user_crud.create(db_session, UserCreate(username="testuser", email="test@example.com", hashed_password="hashed_password_placeholder"))
+    user_id = user.id
+    user_crud.delete(db_session, user)
+
+    await token_versions.refresh(db_session)
+    assert await token_versions.get(db_session, user_id) is None
+
+@pytest.mark.asyncio
+async def test_token_versions_forget_deleted_after_token_lifetime(db_session, monkeypatch):
+    monkeypatch.setattr(token_versions, "token_lifetime", 0)
+    token_versions.discard(12345)
+
+    await token_versions.refresh(db_session)
+    assert token_versions.stats()["deleted"] == 0
+
+# Food cache
+def test_food_cache_refreshed_on_commit(unit_of_work):
+    food = food_crud.create(unit_of_work, {"name": "Pear", "manufacturer": "Generic", "serving_size": 1, "unit": "g",
+                                           "calories": 57, "protein": 0, "carbs": 15, "fat": 0})
+    assert food_cache.get(food.id) is None
+    unit_of_work.commit()
+    assert food_cache.get(food.id).calories == 57
+
+    food_crud.update(unit_of_work, food, {"calories": 60})
+    assert food_cache.get(food.id) is None
+    unit_of_work.commit()
+    assert food_cache.get(food.id).calories == 60
+
+    food_crud.bulk_update(unit_of_work, [{"id": food.id, "calories": 62}])
+    unit_of_work.commit()
+    assert food_cache.get(food.id).calories == 62
+
+    food_id = food.id
+    food_crud.delete(unit_of_work, food)
+    unit_of_work.commit()
+    assert food_cache.get(food_id) is None
+
+def test_food_cache_untouched_by_rollback(unit_of_work):
+    food = food_crud.create(unit_of_work, {"name": "Pear", "manufacturer": "Generic", "serving_size": 1, "unit": "g",
+                                           "calories": 57, "protein": 0, "carbs": 15, "fat": 0})
+    unit_of_work.rollback()
+    assert food_cache.get(food.id) is None
+
+@pytest.mark.asyncio
+async def test_food_crud_get_cached(db_session):
+    food_id = food_crud.create(db_session, {"name": "Pear", "manufacturer": "Generic", "serving_size": 1, "unit": "g",
+                                            "calories": 57, "protein": 0, "carbs": 15, "fat": 0}).id
+    food_cache.clear()
+
+    with track_queries() as queries:
+        assert (await food_crud.get_cached(db_session, food_id)).name == "Pear"
+        assert (await food_crud.get_cached(db_session, food_id)).name == "Pear"
+        assert await food_crud.get_cached(db_session, 99999) is None
+    assert queries.count == 2
+
+# Log totals
+def _totals_setup(db_session):
+    user_id = user_crud.create(db_session, UserCreate(username="testuser", email="test@example.com", hashed_password="hashed_password_placeholder")).id
+    apple = food_crud.create(db_session, {"name": "Apple", "manufacturer": "Generic", "serving_size": 1, "unit": "g",
+                                          "calories": 52, "protein": 0.3, "carbs": 14, "fat": 0.2})
+    rice = food_crud.create(db_session, {"name": "Rice", "manufacturer": "Generic", "serving_size": 1, "unit": "g",
+                                         "calories": 112, "protein": 2.6, "carbs": 23.5, "fat": 0.9})
+    log = daily_log_crud.create(db_session, {"user_id": user_id})
+    return log, apple, rice
+
+def _stored_totals(db_session, log_id):
+    return daily_log_crud.get_totals(db_session, daily_log_crud._model.id == log_id)[log_id]
+
+def test_log_totals_follow_entry_writes(db_session):
+    log, apple, rice = _totals_setup(db_session)
+    assert log.totals == {"calories": 0, "protein": 0, "carbs": 0, "fat": 0}
+
+    entry = food_entry_crud.create(db_session, {"daily_log_id": log.id, "food_id": apple.id, "quantity": 2})
+    food_entry_crud.create(db_session, {"daily_log_id": log.id, "food_id": rice.id, "quantity": 1})
+    assert _stored_totals(db_session, log.id) == pytest.approx({"calories": 216, "protein": 3.2, "carbs": 51.5, "fat": 1.3})
+
+    # Switching the food and quantity takes the old entry out and puts the new one in
+    food_entry_crud.update(db_session, entry, {"food_id": rice.id, "quantity": 0.5})
+    assert _stored_totals(db_session, log.id) == pytest.approx({"calories": 168, "protein": 3.9, "carbs": 35.25, "fat": 1.35})
+
+    food_entry_crud.delete(db_session, entry)
+    assert _stored_totals(db_session, log.id) == pytest.approx({"calories": 112, "protein": 2.6, "carbs": 23.5, "fat": 0.9})
+
+def test_log_totals_follow_food_changes(db_session):
+    log, apple, rice = _totals_setup(db_session)
+    food_entry_crud.create(db_session, {"daily_log_id": log.id, "food_id": apple.id, "quantity": 2})
+    food_entry_crud.create(db_session, {"daily_log_id": log.id, "food_id": rice.id, "quantity": 1})
+
+    food_crud.update(db_session, apple, {"calories": 50})
+    assert _stored_totals(db_session, log.id)["calories"] == pytest.approx(212)
+
+    result = food_crud.bulk_update(db_session, [{"id": apple.id, "protein": 1.3}, {"id": rice.id, "calories": 100, "fat": 1}])
+    assert result.errors == []
+    assert _stored_totals(db_session, log.id) == pytest.approx({"calories": 200, "protein": 5.2, "carbs": 51.5, "fat": 1.4})
+
+def test_log_totals_reconcile(db_session):
+    log, apple, rice = _totals_setup(db_session)
+    other = daily_log_crud.create(db_session, {"user_id": log.user_id, "date": date(2024, 1, 1)})
+    food_entry_crud.create(db_session, {"daily_log_id": log.id, "food_id": apple.id, "quantity": 2})
+    log_id, other_id = log.id, other.id
+
+    # Writes around the ORM don't adjust the totals
+    db_session.execute(text("UPDATE food_entries SET quantity = 3"))
+    db_session.execute(text("UPDATE daily_logs SET total_fat = 9 WHERE id = :id"), {"id": other_id})
+    db_session.commit()
+
+    assert reconcile(db_session, batch_size=1, dry_run=True) == 2
+    assert _stored_totals(db_session, log_id)["calories"] == pytest.approx(104)
+
+    assert reconcile(db_session, batch_size=1) == 2
+    assert _stored_totals(db_session, log_id) == pytest.approx({"calories": 156, "protein": 0.9, "carbs": 42, "fat": 0.6})
+    assert _stored_totals(db_session, other_id) == {"calories": 0, "protein": 0, "carbs": 0, "fat": 0}
+    assert reconcile(db_session) == 0
+
+def test_log_totals_reconcile_keeps_concurrent_entry_write(engine, tables):
+    # Committed sessions of their own, so the writer and reconcile see each other
+    sessions = sessionmaker(bind=engine, expire_on_commit=False)
+    with sessions() as setup:
+        log, apple, rice = _totals_setup(setup)
+        # Drifted, so reconcile has the log to repair while the entry lands
+        setup.execute(text("UPDATE daily_logs SET total_fat = 9 WHERE id = :id"), {"id": log.id})
+        setup.commit()
+
+    # The entry's insert and totals adjustment are flushed, not yet committed
+    writer = sessions()
+    writer.info["unit_of_work"] = True
+    repaired = []
+    def run_reconcile():
+        with sessions() as db:
+            repaired.append(reconcile(db))
+    thread = threading.Thread(target=run_reconcile)
+    try:
+        food_entry_crud.create(writer, {"daily_log_id": log.id, "food_id": apple.id, "quantity": 2})
+        thread.start()
+        # The batch waits on the writer's lock on the log
+        thread.join(timeout=0.5)
+        assert thread.is_alive()
+        writer.commit()
+    finally:
+        writer.close()
+        if thread.is_alive():
+            thread.join(timeout=5)
+
+    assert repaired == [1]
+    with sessions() as check:
+        assert _stored_totals(check, log.id) == pytest.approx({"calories": 104, "protein": 0.6, "carbs": 28, "fat": 0.4})
+        assert reconcile(check, dry_run=True) == 0
+
+# Keyset pages
+def test_crud_get_page_walks_by_cursor(db_session):
+    user = user_crud.create(db_session, UserCreate(username="testuser", email="test@example.com", hashed_password="hashed_password_placeholder"))
+    dates = [date(2024, 1, day) for day in (5, 1, 3, 2, 4)]
+    for log_date in dates:
+        daily_log_crud.create(db_session, {"user_id": user.id, "date": log_date})
+
+    seen, cursor = [], None
+    while True:
+        page = daily_log_crud.get_page(db_session, 2, cursor=cursor, order_by="date", with_total=True, user_id=user.id)
+        assert page.total == len(dates)
+        seen.extend(log.date for log in page.items)
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    assert seen == sorted(dates)
+
+    past_end = daily_log_crud.get_page(db_session, 2, skip=10, with_total=True, user_id=user.id)
+    assert past_end.items == [] and past_end.total == len(dates)
+
+def test_crud_get_page_rejects_bad_input(db_session):
+    with pytest.raises(InvalidCursor):
+        food_crud.get_page(db_session, 10, cursor="not-a-cursor")
+    with pytest.raises(InvalidCursor):
+        daily_log_crud.get_page(db_session, 10, cursor=encode_cursor([1]), order_by="date")
+    with pytest.raises(ValueError):
+        food_crud.get_page(db_session, 10, order_by="food_entries")
+
+@pytest.mark.parametrize("values, order_by", [
+    (["abc"], None),
+    ([{"a": 1}], None),
+    ([True], None),
+    ([1.5], None),
+    ([1, 1], "date"),
+    (["not-a-date", 1], "date"),
+    (["2024-01-01", "1"], "date"),
+])
+def test_crud_get_page_rejects_tampered_cursor(db_session, values, order_by):
+    with pytest.raises(InvalidCursor):
+        daily_log_crud.get_page(db_session, 10, cursor=encode_cursor(values), order_by=order_by)
+
+# Loader presets
+def _log_with_entry(db_session):
+    user = user_crud.create(db_session, UserCreate(username="testuser", email="test@example.com", hashed_password="hashed_password_placeholder"))
+    food = food_crud.create(db_session, FoodCreate(name="Banana", manufacturer="Generic", serving_size=1, unit="g", calories=89, protein=1.1, carbs=23, fat=0.3))
+    log = daily_log_crud.create(db_session, {"user_id": user.id})
+    food_entry_crud.create(db_session, {"daily_log_id": log.id, "food_id": food.id})
+    log_id = log.id
+    db_session.expunge_all()
+    return log_id
+
+def test_loaders_eager_load_declared_paths(db_session):
+    log_id = _log_with_entry(db_session)
+    loaders = Loaders(selectin=["food_entries"], joined=["food_entries.food", "user"])
+
+    log = daily_log_crud.get_one(db_session, id=log_id, options=loaders)
+
+    assert log.user.username == "testuser"
+    assert log.food_entries[0].food.name == "Banana"
+
+def test_loaders_raise_on_undeclared_lazy_load(db_session):
+    log_id = _log_with_entry(db_session)
+
+    log = daily_log_crud.get_one(db_session, id=log_id, options=Loaders(selectin=["food_entries"]))
+    assert len(log.food_entries) == 1
+    with pytest.raises(InvalidRequestError):
+        log.user
+    with pytest.raises(InvalidRequestError):
+        log.food_entries[0].food
+
+def test_loaders_load_only(db_session):
+    log_id = _log_with_entry(db_session)
+
+    log = daily_log_crud.get_one(db_session, id=log_id, options=Loaders(only=["id"]))
+    assert set(inspect(log).unloaded) >= {"date", "user_id"}
+
+# Async CRUD Tests
+@pytest.mark.asyncio
+async def test_async_crud_delegates_to_sync_session(db_session):
+    user = await user_crud.acreate(db_session, UserCreate(username="testuser", email="test@example.com", hashed_password="hashed_password_placeholder"))
+    assert await user_crud.aget_by_username(db_session, "testuser") is user
+    assert await user_crud.aget_one(db_session, id=user.id) is user
+
+@pytest.mark.asyncio
+async def test_async_crud_with_async_session(tables):
+    pytest.importorskip("asyncpg")
+    async_engine = create_async_engine(TEST_DB_URL.replace("postgresql://", "postgresql+asyncpg://", 1))
+    try:
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            user = await user_crud.acreate(db, UserCreate(username="testuser", email="test@example.com", hashed_password="hashed_password_placeholder"))
+            user_id = user.id
+            log = await daily_log_crud.acreate(db, {"user_id": user_id})
+
+            # Like sync reads, nothing is loaded beyond what the options name
+            plain = await daily_log_crud.aget_one(db, id=log.id)
+            assert set(inspect(plain).unloaded) >= {"user", "food_entries"}
+
+            fetched = await daily_log_crud.aget_one(db, id=log.id, options=Loaders(selectin=["user", "food_entries"]))
+            assert fetched.user.username == "testuser"
+            assert fetched.food_entries == []
+
+            with pytest.raises(ValueError):
+                await user_crud.acreate(db, UserCreate(username="testuser", email="other@example.com", hashed_password="hashed_password_placeholder"))
+
+            await daily_log_crud.adelete(db, fetched)
+            assert await daily_log_crud.aget_many(db, limit=10, user_id=user_id) == []
+    finally:
+        await async_engine.dispose()
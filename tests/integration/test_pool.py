@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from backend.database.pool import MeteredQueuePool, PoolMetrics, pool_stats
+from tests.integration.test_auth_integration import TEST_DB_URL
+
+
+@pytest.fixture
+def metered_engine():
+    engine = create_engine(TEST_DB_URL, poolclass=MeteredQueuePool, pool_size=1, max_overflow=1, pool_timeout=0.1)
+    metrics = PoolMetrics("test", engine)
+    yield engine, metrics
+    engine.dispose()
+
+
+def test_pool_metrics_track_checkouts(metered_engine):
+    engine, metrics = metered_engine
+
+    first = engine.connect()
+    second = engine.connect()
+    stats = metrics.stats()
+    assert stats["checked_out"] == 2
+    assert stats["overflow"] == 1
+    assert stats["size"] == 1
+
+    second.close()
+    first.close()
+    stats = metrics.stats()
+    assert stats["checked_out"] == 0
+    assert stats["idle"] == 1
+    assert stats["checkouts"] == 2
+    assert stats["connects"] == 2
+    assert pool_stats()["test"] == stats
+
+
+def test_pool_metrics_record_waits_and_timeouts(metered_engine):
+    engine, metrics = metered_engine
+
+    with engine.connect(), engine.connect():
+        with pytest.raises(PoolTimeoutError):
+            engine.connect()
+
+    stats = metrics.stats()
+    assert stats["timeouts"] == 1
+    assert stats["max_wait_ms"] >= 100
+    assert stats["avg_wait_ms"] is not None
+
+
+def test_pool_metrics_survive_dispose(metered_engine):
+    engine, metrics = metered_engine
+    engine.dispose()
+
+    with engine.connect():
+        assert metrics.stats()["checked_out"] == 1
+    assert metrics.waits == 1
@@ -0,0 +1,30 @@
+from sqlalchemy import text
+
+from backend.database.queries import track_queries
+from tests.integration.test_auth_integration import engine
+
+
+def test_track_queries_counts_statements_and_time(engine):
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        with track_queries() as queries:
+            connection.execute(text("SELECT 1"))
+            connection.execute(text("SELECT 2"))
+
+    assert queries.count == 2
+    assert queries.seconds > 0
+    assert queries.statements == {"SELECT 1": 1, "SELECT 2": 1}
+
+
+def test_track_queries_nested_and_repeated(engine):
+    with engine.connect() as connection:
+        with track_queries() as outer:
+            connection.execute(text("SELECT 1"))
+            with track_queries() as inner:
+                for _ in range(3):
+                    connection.execute(text("SELECT 2"))
+
+    assert outer.count == 4
+    assert inner.count == 3
+    assert outer.repeated(3) == {"SELECT 2": 3}
+    assert inner.repeated(4) == {}
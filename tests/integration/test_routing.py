@@ -0,0 +1,144 @@
+import pytest
+from sqlalchemy import create_engine, delete, event, insert, select, text
+from sqlalchemy.orm import sessionmaker
+
+from backend.auth.auth import create_user_token, get_current_user
+from backend.auth.security import create_access_token
+from backend.database.routing import RoutingSession, recent_writers
+from backend.models import User
+from tests.integration.test_auth_integration import TEST_DB_URL, engine, tables
+
+
+@pytest.fixture
+def engines():
+    primary = create_engine(TEST_DB_URL)
+    # Same database, but opened the way replicas are
+    replica = create_engine(TEST_DB_URL).execution_options(postgresql_readonly=True)
+    yield primary, replica
+    primary.dispose()
+    replica.dispose()
+
+
+@pytest.fixture
+def make_session(engines, tables):
+    primary, replica = engines
+    factory = sessionmaker(class_=RoutingSession, primary=primary, replicas=[replica])
+    sessions = []
+
+    def make(read_only, user_id=None):
+        session = factory()
+        session.info["read_only"] = read_only
+        session.info["user_id"] = user_id
+        sessions.append(session)
+        return session
+
+    yield make
+    for session in sessions:
+        session.close()
+
+
+def test_reads_go_to_replica(engines, make_session):
+    primary, replica = engines
+
+    assert make_session(read_only=True).get_bind() is replica
+    assert make_session(read_only=False).get_bind() is primary
+
+    session = make_session(read_only=True)
+    assert session.execute(text("show transaction_read_only")).scalar() == "on"
+
+
+def test_writes_go_to_primary(engines, make_session):
+    primary, replica = engines
+    session = make_session(read_only=True)
+
+    session.add(User(username="writer", email="writer@example.com", hashed_password="x"))
+    session.commit()
+
+    assert session.execute(select(User.username)).scalar() == "writer"
+    session.delete(session.execute(select(User)).scalar_one())
+    session.commit()
+
+
+def test_reads_stick_to_primary_after_write(engines, make_session):
+    primary, replica = engines
+    session = make_session(read_only=False, user_id=42)
+    session.add(User(username="writer", email="writer@example.com", hashed_password="x"))
+    session.commit()
+
+    assert recent_writers.get(42) is True
+    assert make_session(read_only=True, user_id=42).get_bind() is primary
+    assert make_session(read_only=True, user_id=7).get_bind() is replica
+
+    session.delete(session.execute(select(User)).scalar_one())
+    session.commit()
+
+
+def test_reads_stick_to_primary_after_statement_write(engines, make_session):
+    primary, replica = engines
+    session = make_session(read_only=False, user_id=42)
+    # A Core statement, which writes without flushing
+    session.execute(insert(User).values(username="writer", email="writer@example.com", hashed_password="x"))
+    session.commit()
+
+    assert recent_writers.get(42) is True
+    assert make_session(read_only=True, user_id=42).get_bind() is primary
+
+    session.execute(delete(User))
+    session.commit()
+
+
+def test_reads_do_not_mark_writer(make_session):
+    session = make_session(read_only=False, user_id=42)
+    session.execute(select(User))
+    session.commit()
+
+    assert recent_writers.get(42) is None
+
+
+@pytest.fixture
+def replica_statements(engines):
+    primary, replica = engines
+    statements = []
+    event.listen(replica.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+@pytest.fixture
+def writer(make_session):
+    session = make_session(read_only=False)
+    user = User(username="writer", email="writer@example.com", hashed_password="x")
+    session.add(user)
+    session.commit()
+    yield user
+    session.execute(delete(User))
+    session.commit()
+
+
+@pytest.mark.asyncio
+async def test_auth_reads_stick_to_primary_after_write(make_session, replica_statements, writer):
+    recent_writers.set(writer.id, True)
+    session = make_session(read_only=True)
+
+    principal = await get_current_user(session, create_user_token(writer))
+
+    assert principal.id == writer.id
+    assert replica_statements == []
+
+
+@pytest.mark.asyncio
+async def test_auth_without_uid_reads_primary(make_session, replica_statements, writer):
+    session = make_session(read_only=True)
+
+    principal = await get_current_user(session, create_access_token({"sub": writer.username}))
+
+    assert principal.id == writer.id
+    assert replica_statements == []
+
+
+@pytest.mark.asyncio
+async def test_auth_reads_go_to_replica_without_write(make_session, replica_statements, writer):
+    session = make_session(read_only=True)
+
+    await get_current_user(session, create_user_token(writer))
+
+    assert replica_statements
@@ -0,0 +1,85 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from backend.analytics import NUTRIENTS, compute_trends, deltas, macro_percentages, moving_average, serialize
+
+nan = np.nan
+
+
+def column(*values):
+    return np.array(values, dtype=float).reshape(-1, 1)
+
+
+def test_moving_average_skips_missing_days():
+    values = column(1, 2, nan, 4, nan, nan, nan)
+    averages = moving_average(values, 3)[:, 0]
+
+    np.testing.assert_allclose(averages[:6], [1, 1.5, 1.5, 3, 4, 4])
+    assert np.isnan(averages[6])
+
+
+def test_deltas_need_both_days():
+    result = deltas(column(1, 3, nan, 5, 4))[:, 0]
+
+    assert np.isnan(result[[0, 2, 3]]).all()
+    np.testing.assert_allclose(result[[1, 4]], [2, -1])
+
+
+def test_macro_percentages():
+    # calories, protein, carbs, fat
+    values = np.array([[0, 25, 50, 0], [0, 10, 10, 80 / 9], [0, 0, 0, 0], [nan] * 4])
+    result = macro_percentages(values)
+
+    np.testing.assert_allclose(result[0], [100 / 3, 200 / 3, 0])
+    np.testing.assert_allclose(result[1], [25, 25, 50])
+    assert np.isnan(result[2:]).all()
+
+
+def test_compute_trends_drops_lead_days():
+    totals = np.tile(column(100, 200, 300, 400), len(NUTRIENTS))
+    trends = compute_trends(totals, lead=2, windows=(2,))
+
+    np.testing.assert_allclose(trends["totals"][:, 0], [300, 400])
+    np.testing.assert_allclose(trends["moving_averages"][2][:, 0], [250, 350])
+    np.testing.assert_allclose(trends["deltas"][:, 0], [100, 100])
+
+
+def test_serialize_replaces_nan_with_none():
+    start = datetime.date(2024, 2, 28)
+    totals = np.array([[100.123, 10, 10, 0], [nan] * 4, [50, 0, 0, 5]])
+    data = serialize(compute_trends(totals, lead=0, windows=(7,)), start, datetime.date(2024, 3, 1))
+
+    assert data["dates"] == ["2024-02-28", "2024-02-29", "2024-03-01"]
+    assert data["totals"]["calories"] == [100.12, None, 50]
+    assert data["moving_averages"]["7"]["calories"] == [100.12, 100.12, 75.06]
+    assert data["deltas"]["calories"] == [None, None, None]
+    assert data["macro_percentages"]["fat"] == [0, None, 100]
+
+
+@pytest.mark.benchmark
+def test_trends_benchmark():
+    """Benchmark computing and serializing every series over five years of days"""
+    import time
+
+    rng = np.random.default_rng(0)
+    days = 5 * 365 + 29
+    totals = rng.normal([2000, 120, 250, 70], [300, 20, 40, 15], size=(days, len(NUTRIENTS)))
+    totals[rng.random(days) < 0.2] = nan
+    start = datetime.date(2020, 1, 1)
+    end = start + datetime.timedelta(days=days - 30)
+    rounds = 20
+
+    began = time.perf_counter()
+    for _ in range(rounds):
+        trends = compute_trends(totals, lead=29)
+    computed = (time.perf_counter() - began) / rounds
+
+    began = time.perf_counter()
+    for _ in range(rounds):
+        data = serialize(trends, start, end)
+    serialized = (time.perf_counter() - began) / rounds
+
+    print(f"trends over {days - 29} days: compute {computed * 1e3:.2f}ms, serialize {serialized * 1e3:.2f}ms")
+    assert len(data["dates"]) == len(data["moving_averages"]["30"]["fat"]) == days - 29
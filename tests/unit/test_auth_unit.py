@@ -1,11 +1,16 @@
 import pytest
 from datetime import datetime, timedelta, UTC
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from jose import jwt
 from fastapi import HTTPException
 
-from backend.auth.security import verify_password, get_password_hash, create_access_token
-from backend.auth.auth import authenticate_user, get_current_user
+from backend.auth import security
+from backend.auth.security import (
+    verify_password, get_password_hash, create_access_token, averify_password, aget_password_hash,
+    decode_access_token, token_cache
+)
+from backend.auth.auth import authenticate_user, get_current_user, create_user_token
+from backend.crud.user import user_cache, token_versions
 from backend.config import settings
 from backend.models.user import User
 
@@ -21,10 +26,13 @@ def mock_db():
 def test_user():
     """Fixture for a test user object"""
     user = MagicMock(spec=User)
+    user.id = 1
+    user.role = "user"
     user.username = "testuser"
     user.email = "test@example.com"
     user.hashed_password = get_password_hash("password123")
     user.is_active = True
+    user.token_version = 0
     return user
 
 @pytest.fixture
@@ -58,6 +66,28 @@ def test_password_hashing():
     assert verify_password(password, hashed)
     assert not verify_password("wrongpassword", hashed)
 
+@pytest.mark.asyncio
+async def test_async_password_hashing():
+    """Test that the pooled hashing API matches the inline one"""
+    hashed = await aget_password_hash("securepassword123")
+
+    assert verify_password("securepassword123", hashed)
+    assert await averify_password("securepassword123", hashed)
+    assert not await averify_password("wrongpassword", hashed)
+
+@pytest.mark.asyncio
+async def test_async_password_hashing_saturated(monkeypatch):
+    """Test that a full hashing pool answers 503 instead of queueing"""
+    full = security.threading.BoundedSemaphore(1)
+    full.acquire()
+    monkeypatch.setattr(security, "_hash_slots", full)
+
+    with pytest.raises(HTTPException) as excinfo:
+        await aget_password_hash("securepassword123")
+
+    assert excinfo.value.status_code == 503
+    assert excinfo.value.headers["Retry-After"] == "1"
+
 def test_create_access_token():
     """Test token creation with various parameters"""
     # Test with default expiration
@@ -81,36 +111,55 @@ def test_create_access_token():
     assert payload["sub"] == "testuser"
     assert payload["exp"] <= now + 610  # 10 minutes + 10 seconds buffer
 
+def test_decode_access_token_memoized():
+    """Test that a verified token is decoded once and then served from the cache"""
+    token = create_access_token({"sub": "testuser"})
+
+    with patch("backend.auth.security.jwt.decode", wraps=jwt.decode) as decode:
+        first = decode_access_token(token)
+        second = decode_access_token(token)
+
+    assert decode.call_count == 1
+    assert second["sub"] == first["sub"] == "testuser"
+    assert token_cache.stats()["hits"] == 1
+
+def test_decode_access_token_rejects_invalid(expired_token):
+    """Test that rejected tokens raise and are never cached"""
+    tampered = jwt.encode({"sub": "testuser"}, "different-secret-key", algorithm=settings.ALGORITHM)
+
+    for token in (expired_token, tampered):
+        with pytest.raises(jwt.JWTError):
+            decode_access_token(token)
+    assert token_cache.stats()["size"] == 0
+
 # Unit tests for auth.py functions
 
 def test_authenticate_user_success_username(mock_db, test_user):
     """Test authentication with correct username and password"""
-    with patch("backend.crud.user.user_crud.get_by_username", return_value=test_user):
-        with patch("backend.crud.user.user_crud.get_by_email", return_value=None):
-            user = authenticate_user(mock_db, "testuser", "password123")
-            assert user is not None
-            assert user.username == "testuser"
+    with patch("backend.crud.user.user_crud.get_by_identifier", return_value=test_user) as lookup:
+        user = authenticate_user(mock_db, "testuser", "password123")
+        assert user is not None
+        assert user.username == "testuser"
+        lookup.assert_called_once_with(mock_db, "testuser")
 
 def test_authenticate_user_success_email(mock_db, test_user):
     """Test authentication with correct email and password"""
-    with patch("backend.crud.user.user_crud.get_by_username", return_value=None):
-        with patch("backend.crud.user.user_crud.get_by_email", return_value=test_user):
-            user = authenticate_user(mock_db, "test@example.com", "password123")
-            assert user is not None
-            assert user.email == "test@example.com"
+    with patch("backend.crud.user.user_crud.get_by_identifier", return_value=test_user):
+        user = authenticate_user(mock_db, "test@example.com", "password123")
+        assert user is not None
+        assert user.email == "test@example.com"
 
 def test_authenticate_user_wrong_password(mock_db, test_user):
     """Test authentication with wrong password"""
-    with patch("backend.crud.user.user_crud.get_by_username", return_value=test_user):
+    with patch("backend.crud.user.user_crud.get_by_identifier", return_value=test_user):
         user = authenticate_user(mock_db, "testuser", "wrongpassword")
         assert user is None
 
 def test_authenticate_user_nonexistent(mock_db):
     """Test authentication with non-existent user"""
-    with patch("backend.crud.user.user_crud.get_by_username", return_value=None):
-        with patch("backend.crud.user.user_crud.get_by_email", return_value=None):
-            user = authenticate_user(mock_db, "nonexistent", "password123")
-            assert user is None
+    with patch("backend.crud.user.user_crud.get_by_identifier", return_value=None):
+        user = authenticate_user(mock_db, "nonexistent", "password123")
+        assert user is None
 
 @pytest.mark.asyncio
 async def test_get_current_user_success(mock_db, test_user, valid_token):
@@ -120,6 +169,18 @@ async def test_get_current_user_success(mock_db, test_user, valid_token):
         assert user is not None
         assert user.username == "testuser"
 
+@pytest.mark.asyncio
+async def test_get_current_user_cached(mock_db, test_user, valid_token):
+    """Test that repeated lookups are served from the user cache"""
+    with patch("backend.crud.user.user_crud.get_by_username", return_value=test_user) as lookup:
+        first = await get_current_user(db=mock_db, token=valid_token)
+        second = await get_current_user(db=mock_db, token=valid_token)
+
+    assert lookup.call_count == 1
+    assert second == first
+    assert second.id == 1 and second.role == "user" and second.is_active
+    assert user_cache.stats()["hits"] == 1
+
 @pytest.mark.asyncio
 async def test_get_current_user_invalid_token(mock_db):
     """Test getting current user with invalid token format"""
@@ -148,6 +209,31 @@ async def test_get_current_user_user_not_found(mock_db, valid_token):
         assert excinfo.value.status_code == 401
         assert "Could not validate credentials" in excinfo.value.detail
 
+@pytest.mark.asyncio
+async def test_get_current_user_stateless(mock_db, test_user, monkeypatch):
+    """Test that stateless mode authorizes from token claims without loading the user"""
+    monkeypatch.setattr(settings, "AUTH_STATELESS", True)
+    token = create_user_token(test_user)
+
+    with patch("backend.crud.user.user_crud.get_by_username") as lookup, \
+         patch.object(token_versions, "get", AsyncMock(return_value=0)):
+        user = await get_current_user(db=mock_db, token=token)
+
+    lookup.assert_not_called()
+    assert user.id == 1 and user.role == "user" and user.is_active
+
+@pytest.mark.asyncio
+async def test_get_current_user_stateless_revoked(mock_db, test_user, monkeypatch):
+    """Test that a stateless token is rejected once the user's token version moves on"""
+    monkeypatch.setattr(settings, "AUTH_STATELESS", True)
+    token = create_user_token(test_user)
+
+    with patch.object(token_versions, "get", AsyncMock(return_value=1)):
+        with pytest.raises(HTTPException) as excinfo:
+            await get_current_user(db=mock_db, token=token)
+
+    assert excinfo.value.status_code == 401
+
 # Security-focused tests
 
 def test_token_tampering():
@@ -208,4 +294,85 @@ def test_auth_performance():
     
     # Token operations should be relatively fast
     assert token_time < 0.01, f"Token creation took {token_time} seconds"
-    assert verify_time < 0.01, f"Token verification took {verify_time} seconds"
\ No newline at end of file
+    assert verify_time < 0.01, f"Token verification took {verify_time} seconds"
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+async def test_concurrent_login_throughput():
+    """Benchmark concurrent password checks run inline vs in the hashing pool"""
+    import asyncio
+    import time
+
+    hashed = get_password_hash("password123")
+    logins = 6
+
+    async def measure(check):
+        stalls = []
+        done = asyncio.Event()
+
+        async def ticker():
+            # Measures how long the event loop is unable to run other requests
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.001)
+                stalls.append(time.perf_counter() - start)
+
+        tick = asyncio.create_task(ticker())
+        start = time.perf_counter()
+        await asyncio.gather(*(check() for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await tick
+        return logins / elapsed, max(stalls, default=elapsed)
+
+    async def inline():
+        return verify_password("password123", hashed)
+
+    async def pooled():
+        return await averify_password("password123", hashed)
+
+    inline_rate, inline_stall = await measure(inline)
+    pooled_rate, pooled_stall = await measure(pooled)
+    print(
+        f"inline: {inline_rate:.1f} logins/s, max loop stall {inline_stall * 1000:.0f}ms; "
+        f"pooled: {pooled_rate:.1f} logins/s, max loop stall {pooled_stall * 1000:.0f}ms"
+    )
+
+@pytest.mark.benchmark
+def test_token_decode_benchmark():
+    """Benchmark JWT verification with and without the verified-token cache"""
+    import time
+
+    token = create_access_token({"sub": "testuser"})
+    rounds = 2000
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    uncached = (time.perf_counter() - start) / rounds
+
+    decode_access_token(token)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        decode_access_token(token)
+    cached = (time.perf_counter() - start) / rounds
+
+    print(f"jwt.decode: {uncached * 1e6:.1f}us/call; cached: {cached * 1e6:.1f}us/call")
+
+@pytest.mark.benchmark
+def test_revocation_check_benchmark():
+    """Benchmark the revocation check on the authenticated hot path"""
+    import time
+    import uuid
+    from backend.auth.revocation import revocations
+
+    for _ in range(10000):
+        revocations.add(uuid.uuid4().hex, time.time() + 60)
+    jtis = [uuid.uuid4().hex for _ in range(10000)]
+
+    start = time.perf_counter()
+    for jti in jtis:
+        revocations.is_revoked(jti)
+    per_call = (time.perf_counter() - start) / len(jtis)
+
+    print(f"is_revoked: {per_call * 1e6:.2f}us/call with {len(revocations._expiry)} revoked tokens")
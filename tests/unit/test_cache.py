@@ -0,0 +1,55 @@
+import pytest
+
+from backend.cache import TTLCache, cache_stats
+
+
+@pytest.fixture
+def cache():
+    return TTLCache("test", maxsize=2, ttl=60)
+
+
+def test_cache_get_set(cache):
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("missing") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_cache_evicts_least_recently_used(cache):
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_cache_entries_expire(cache, monkeypatch):
+    import backend.cache
+
+    now = [1000.0]
+    monkeypatch.setattr(backend.cache.time, "monotonic", lambda: now[0])
+
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=5)
+    now[0] += 10
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+    now[0] += 60
+    assert cache.get("a") is None
+
+
+def test_cache_pop_and_disabled():
+    cache = TTLCache("disabled", maxsize=10, ttl=0)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+    cache = TTLCache("test", maxsize=10, ttl=60)
+    cache.set("a", 1)
+    assert cache.pop("a") == 1
+    assert cache.get("a") is None
+    assert "test" in cache_stats()
@@ -0,0 +1,40 @@
+import time
+import uuid
+
+from backend.auth.revocation import BloomFilter, revocations
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000)
+    items = [uuid.uuid4().hex for _ in range(1000)]
+    for item in items:
+        bloom.add(item)
+
+    assert all(item in bloom for item in items)
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter(capacity=1000)
+    for _ in range(1000):
+        bloom.add(uuid.uuid4().hex)
+
+    false_positives = sum(uuid.uuid4().hex in bloom for _ in range(10000))
+    assert false_positives < 300
+
+
+def test_revoked_token_expires():
+    live, expired = uuid.uuid4().hex, uuid.uuid4().hex
+    revocations.add(live, time.time() + 60)
+    revocations.add(expired, time.time() - 1)
+
+    assert revocations.is_revoked(live)
+    assert not revocations.is_revoked(expired)
+    assert not revocations.is_revoked(uuid.uuid4().hex)
+    assert not revocations.is_revoked(None)
+
+
+def test_unrevoked_tokens_pass_with_many_revoked():
+    for _ in range(10000):
+        revocations.add(uuid.uuid4().hex, time.time() + 60)
+
+    assert not any(revocations.is_revoked(uuid.uuid4().hex) for _ in range(1000))